@@ -1,13 +1,14 @@
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import numpy as np
 from datetime import datetime, timedelta
 import os
+import html
+from pathlib import Path
 import json
 from dynamic_ticketing import DynamicTicketing
+from ticket_actions import resolve_by_admin, add_admin_response
 
 # Set page config
 st.set_page_config(
@@ -17,65 +18,12 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better UI
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: 700;
-        color: #1E3A8A;
-        text-align: center;
-        margin-bottom: 1rem;
-    }
-    .card {
-        border-radius: 10px;
-        padding: 1.5rem;
-        background-color: white;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin-bottom: 1rem;
-    }
-    .metric-value {
-        font-size: 2.5rem;
-        font-weight: 700;
-        text-align: center;
-    }
-    .metric-label {
-        font-size: 1rem;
-        color: #6B7280;
-        text-align: center;
-    }
-    .stat-card {
-        border-left: 5px solid #1E88E5;
-        border-radius: 5px;
-        padding: 10px;
-        background-color: #F3F4F6;
-        margin-bottom: 10px;
-    }
-    .sidebar-title {
-        font-weight: 700;
-        color: #1E3A8A;
-    }
-    .plot-container {
-        border-radius: 10px;
-        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.05);
-        margin-bottom: 1.5rem;
-        background-color: white;
-        padding: 1rem;
-    }
-    .user-msg {
-        background-color: #E3F2FD;
-        padding: 10px 15px;
-        border-radius: 15px 15px 15px 5px;
-        margin-bottom: 10px;
-    }
-    .assistant-msg {
-        background-color: #F1F1F1;
-        padding: 10px 15px;
-        border-radius: 15px 15px 5px 15px;
-        margin-bottom: 10px;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for better UI, read from disk once per process
+@st.cache_data
+def _css():
+    return (Path(__file__).parent / "assets" / "admin.css").read_text()
+
+st.markdown(f"<style>{_css()}</style>", unsafe_allow_html=True)
 
 # Initialize the ticket system
 @st.cache_resource
@@ -84,6 +32,55 @@ def get_ticket_system():
 
 ticket_system = get_ticket_system()
 
+# Cached ticket loaders keyed on the store version, so reruns reuse them until a write happens.
+# Every write bumps the version, so only the latest couple of copies are kept
+@st.cache_data(max_entries=2)
+def _load_resolved(version):
+    return ticket_system.get_all_resolved_tickets()
+
+@st.cache_data(max_entries=2)
+def _load_unresolved(version):
+    return ticket_system.get_all_unresolved_tickets()
+
+# Columns shown in the ticket tables; conversations are never loaded into DataFrames
+DISPLAY_COLS_RES = (
+    'Ticket_ID', 'Issue_Category', 'Sentiment', 'Priority',
+    'Solution', 'Ticket_Open_Date', 'Date_of_Resolution', 'Assigned_To_Team'
+)
+DISPLAY_COLS_UNRES = (
+    'Ticket_ID', 'Issue_Category', 'Sentiment', 'Priority',
+    'Ticket_Open_Date', 'Assigned_To_Team', 'Resolution_Status'
+)
+
+# Low-cardinality columns stored as categoricals for faster grouping and stable chart ordering
+CATEGORICAL_COLS = ('Assigned_To_Team', 'Issue_Category', 'Priority', 'Sentiment')
+
+# Rows rendered in the embedded ticket tables; the rest are behind a "Show all" expander
+PREVIEW_N = 200
+
+def tickets_to_df(tickets, columns):
+    df = pd.DataFrame([{k: t.get(k) for k in columns} for t in tickets], columns=list(columns))
+    for c in CATEGORICAL_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype('category')
+    return df
+
+# Build the resolved-tickets frame with dates parsed once; cached on a cheap data key
+@st.cache_data(max_entries=2)
+def build_resolved_df(data_key, _tickets):
+    df = tickets_to_df(_tickets, DISPLAY_COLS_RES)
+    df['_open_ts'] = pd.to_datetime(df['Ticket_Open_Date'], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    df['_res_ts'] = pd.to_datetime(df['Date_of_Resolution'], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    df['Resolution_Time_Hours'] = ((df['_res_ts'] - df['_open_ts']).dt.total_seconds() / 3600).round(1)
+    return df
+
+# Count tickets per value of a column, memoized per data key and column (room for every
+# chart's column across the latest couple of data keys)
+@st.cache_data(max_entries=16)
+def count_by(data_key, column, label, _df):
+    counts = _df.groupby(column, sort=False, observed=True).size().reset_index(name='Count')
+    return counts.rename(columns={column: label}).sort_values('Count', ascending=False, ignore_index=True)
+
 # Sidebar with improved UI
 with st.sidebar:
     st.markdown('<p class="sidebar-title">ADMIN DASHBOARD</p>', unsafe_allow_html=True)
@@ -104,7 +101,27 @@ with st.sidebar:
     st.markdown("© 2025 Support System")
     st.markdown(f"**Version:** 2.0")
 
-# Function to calculate resolution time in hours
+# Reuse a Plotly figure from session state while its input data is unchanged
+def cached_figure(name, data, build):
+    sig = int(pd.util.hash_pandas_object(data, index=False).sum())
+    if st.session_state.get(f'{name}_sig') != sig:
+        st.session_state[name] = build()
+        st.session_state[f'{name}_sig'] = sig
+    return st.session_state[name]
+
+# Render a ticket conversation as a single HTML block (one delta instead of two per message)
+def render_conversation(conversation):
+    parts = []
+    for msg in conversation:
+        is_user = msg.get('role') == 'user'
+        cls = 'user-msg' if is_user else 'assistant-msg'
+        role = 'User' if is_user else 'Assistant'
+        timestamp = html.escape(str(msg.get('timestamp', 'N/A')))
+        content = html.escape(str(msg.get('content', '')))
+        parts.append(f"<b>{role}</b> ({timestamp}):<div class='{cls}'>{content}</div>")
+    st.markdown("".join(parts), unsafe_allow_html=True)
+
+# Function to calculate resolution time in hours for a single ticket (detail view)
 def get_resolution_time(open_date, resolution_date):
     if not open_date or not resolution_date:
         return None
@@ -118,46 +135,158 @@ def get_resolution_time(open_date, resolution_date):
     except Exception as e:
         return None
 
+def _resolved_ticket_details(selected_ticket_id, ticket):
+    st.markdown(f"<h3>Ticket Details: {selected_ticket_id}</h3>", unsafe_allow_html=True)
+    
+    # Calculate resolution time
+    resolution_time = get_resolution_time(
+        ticket.get('Ticket_Open_Date'), 
+        ticket.get('Date_of_Resolution')
+    )
+    
+    # Display ticket details with improved styling
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.markdown("<p class='stat-card'><b>Issue:</b> {}</p>".format(ticket.get('Issue_Category')), unsafe_allow_html=True)
+        st.markdown("<p class='stat-card'><b>Priority:</b> {}</p>".format(ticket.get('Priority')), unsafe_allow_html=True)
+        st.markdown("<p class='stat-card'><b>Team:</b> {}</p>".format(ticket.get('Assigned_To_Team')), unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown("<p class='stat-card'><b>Opened:</b> {}</p>".format(ticket.get('Ticket_Open_Date')), unsafe_allow_html=True)
+        st.markdown("<p class='stat-card'><b>Resolved:</b> {}</p>".format(ticket.get('Date_of_Resolution')), unsafe_allow_html=True)
+        if resolution_time:
+            st.markdown("<p class='stat-card'><b>Resolution Time:</b> {} hours</p>".format(resolution_time), unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown("<p class='stat-card'><b>Sentiment:</b> {}</p>".format(ticket.get('Sentiment')), unsafe_allow_html=True)
+        st.markdown("<p class='stat-card'><b>Status:</b> {}</p>".format(ticket.get('Resolution_Status')), unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Display solution
+    st.subheader("Solution")
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.write(ticket.get('Solution', 'No solution recorded'))
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Display conversation
+    st.subheader("Conversation")
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    
+    render_conversation(ticket.get('conversation', []))
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def _unresolved_ticket_details(selected_ticket_id, ticket):
+    st.markdown(f"<h3>Ticket Details: {selected_ticket_id}</h3>", unsafe_allow_html=True)
+    
+    # Calculate time open
+    time_open = None
+    if ticket.get('Ticket_Open_Date'):
+        try:
+            open_dt = datetime.strptime(ticket.get('Ticket_Open_Date'), "%Y-%m-%d %H:%M:%S")
+            delta = datetime.now() - open_dt
+            time_open = round(delta.total_seconds() / 3600, 1)
+        except Exception as e:
+            pass
+    
+    # Display ticket details with improved styling
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.markdown("<p class='stat-card'><b>Issue:</b> {}</p>".format(ticket.get('Issue_Category')), unsafe_allow_html=True)
+        st.markdown("<p class='stat-card'><b>Priority:</b> {}</p>".format(ticket.get('Priority')), unsafe_allow_html=True)
+        st.markdown("<p class='stat-card'><b>Team:</b> {}</p>".format(ticket.get('Assigned_To_Team')), unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown("<p class='stat-card'><b>Opened:</b> {}</p>".format(ticket.get('Ticket_Open_Date')), unsafe_allow_html=True)
+        if time_open:
+            st.markdown("<p class='stat-card'><b>Time Open:</b> {} hours</p>".format(time_open), unsafe_allow_html=True)
+        st.markdown("<p class='stat-card'><b>Status:</b> {}</p>".format(ticket.get('Status', 'Unresolved')), unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown("<p class='stat-card'><b>Sentiment:</b> {}</p>".format(ticket.get('Sentiment')), unsafe_allow_html=True)
+        
+        # Add action buttons for ticket management
+        if st.button("Mark as Resolved", key=f"resolve_{selected_ticket_id}"):
+            if resolve_by_admin(ticket_system, selected_ticket_id):
+                st.success(f"Ticket {selected_ticket_id} marked as resolved!")
+                st.rerun()
+            else:
+                st.error(f"Ticket {selected_ticket_id} is no longer open")
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Display conversation
+    st.subheader("Conversation")
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    
+    render_conversation(ticket.get('conversation', []))
+    
+    # Add a form to respond to the ticket
+    with st.form(key=f"respond_form_{selected_ticket_id}"):
+        response_text = st.text_area("Add a response to this ticket")
+        submit_button = st.form_submit_button(label="Send Response")
+        
+        if submit_button and response_text:
+            # Add the response to the conversation
+            if add_admin_response(ticket_system, selected_ticket_id, response_text):
+                st.success("Response added successfully!")
+                st.rerun()
+            else:
+                st.error(f"Ticket {selected_ticket_id} not found")
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def _ticket_detail_panel(tickets_by_id, resolved):
+    # Ticket selection for details
+    selected_ticket_id = st.selectbox(
+        "Select a ticket to view details:", 
+        options=list(tickets_by_id)
+    )
+    
+    if selected_ticket_id:
+        ticket = tickets_by_id.get(selected_ticket_id)
+        if ticket:
+            if resolved:
+                _resolved_ticket_details(selected_ticket_id, ticket)
+            else:
+                _unresolved_ticket_details(selected_ticket_id, ticket)
+
 # Overview Page with enhanced visualization
 if selected_page == "Overview":
+    # Plotly is only imported on pages that draw charts
+    import plotly.express as px
+    import plotly.graph_objects as go
+    
     st.markdown('<p class="main-header">Support System Overview</p>', unsafe_allow_html=True)
     
     # Get all tickets
-    resolved_tickets = ticket_system.get_all_resolved_tickets()
-    unresolved_tickets = ticket_system.get_all_unresolved_tickets()
+    version = ticket_system.version
+    resolved_tickets = _load_resolved(version)
+    unresolved_tickets = _load_unresolved(version)
     total_tickets = len(resolved_tickets) + len(unresolved_tickets)
     
     # Create metrics row with improved styling
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-        st.markdown(f'<p class="metric-value">{total_tickets}</p>', unsafe_allow_html=True)
-        st.markdown('<p class="metric-label">Total Tickets</p>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        st.metric(label="Total Tickets", value=total_tickets)
     
     with col2:
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-        st.markdown(f'<p class="metric-value" style="color: #10B981;">{len(resolved_tickets)}</p>', unsafe_allow_html=True)
-        st.markdown('<p class="metric-label">Resolved</p>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        st.metric(label="Resolved", value=len(resolved_tickets))
     
     with col3:
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-        st.markdown(f'<p class="metric-value" style="color: #F59E0B;">{len(unresolved_tickets)}</p>', unsafe_allow_html=True)
-        st.markdown('<p class="metric-label">Unresolved</p>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        st.metric(label="Unresolved", value=len(unresolved_tickets))
     
     with col4:
         resolution_rate = round((len(resolved_tickets) / total_tickets * 100), 1) if total_tickets else 0
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-        st.markdown(f'<p class="metric-value" style="color: #3B82F6;">{resolution_rate}%</p>', unsafe_allow_html=True)
-        st.markdown('<p class="metric-label">Resolution Rate</p>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+        st.metric(label="Resolution Rate", value=f"{resolution_rate}%")
     
     # Create some analytics with improved visualizations
     if resolved_tickets:
-        df_resolved = pd.DataFrame(resolved_tickets)
+        data_key = ('resolved', version)
+        df_resolved = build_resolved_df(data_key, resolved_tickets)
         
         # Create a 2x2 grid of charts
         chart_col1, chart_col2 = st.columns(2)
@@ -165,14 +294,20 @@ if selected_page == "Overview":
         with chart_col1:
             st.markdown('<div class="plot-container">', unsafe_allow_html=True)
             st.subheader("Tickets by Team")
-            team_counts = df_resolved['Assigned_To_Team'].value_counts().reset_index()
-            team_counts.columns = ['Team', 'Count']
+            team_counts = count_by(data_key, 'Assigned_To_Team', 'Team', df_resolved)
             
             # Create donut chart
-            fig1 = px.pie(team_counts, values='Count', names='Team', hole=0.4,
-                          color_discrete_sequence=px.colors.qualitative.Bold)
-            fig1.update_traces(textinfo='percent+label', pull=[0.05 if i == team_counts['Count'].idxmax() else 0 for i in range(len(team_counts))])
-            fig1.update_layout(margin=dict(t=30, b=0, l=0, r=0), height=350)
+            def build_team_donut():
+                fig = px.pie(team_counts, values='Count', names='Team', hole=0.4,
+                             color_discrete_sequence=px.colors.qualitative.Bold)
+                # Pull out the largest slice
+                pulls = np.zeros(len(team_counts))
+                pulls[team_counts['Count'].values.argmax()] = 0.05
+                fig.update_traces(textinfo='percent+label', pull=pulls.tolist())
+                fig.update_layout(margin=dict(t=30, b=0, l=0, r=0), height=350)
+                return fig
+            
+            fig1 = cached_figure('team_donut', team_counts, build_team_donut)
             st.plotly_chart(fig1, use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
@@ -181,26 +316,30 @@ if selected_page == "Overview":
             st.subheader("Ticket Resolution Progress")
             
             # Create gauge chart for resolution rate
-            fig2 = go.Figure(go.Indicator(
-                mode="gauge+number",
-                value=resolution_rate,
-                title={'text': "Resolution Rate"},
-                gauge={
-                    'axis': {'range': [0, 100], 'tickwidth': 1},
-                    'bar': {'color': "#3B82F6"},
-                    'steps': [
-                        {'range': [0, 30], 'color': "#FEE2E2"},
-                        {'range': [30, 70], 'color': "#FEF3C7"},
-                        {'range': [70, 100], 'color': "#D1FAE5"}
-                    ],
-                    'threshold': {
-                        'line': {'color': "red", 'width': 4},
-                        'thickness': 0.75,
-                        'value': 90
+            def build_resolution_gauge():
+                fig = go.Figure(go.Indicator(
+                    mode="gauge+number",
+                    value=resolution_rate,
+                    title={'text': "Resolution Rate"},
+                    gauge={
+                        'axis': {'range': [0, 100], 'tickwidth': 1},
+                        'bar': {'color': "#3B82F6"},
+                        'steps': [
+                            {'range': [0, 30], 'color': "#FEE2E2"},
+                            {'range': [30, 70], 'color': "#FEF3C7"},
+                            {'range': [70, 100], 'color': "#D1FAE5"}
+                        ],
+                        'threshold': {
+                            'line': {'color': "red", 'width': 4},
+                            'thickness': 0.75,
+                            'value': 90
+                        }
                     }
-                }
-            ))
-            fig2.update_layout(margin=dict(t=30, b=0, l=0, r=0), height=350)
+                ))
+                fig.update_layout(margin=dict(t=30, b=0, l=0, r=0), height=350)
+                return fig
+            
+            fig2 = cached_figure('resolution_gauge', pd.Series([resolution_rate]), build_resolution_gauge)
             st.plotly_chart(fig2, use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
@@ -210,13 +349,16 @@ if selected_page == "Overview":
         with chart_col3:
             st.markdown('<div class="plot-container">', unsafe_allow_html=True)
             st.subheader("Top Issue Categories")
-            issue_counts = df_resolved['Issue_Category'].value_counts().reset_index()
-            issue_counts.columns = ['Issue', 'Count']
+            issue_counts = count_by(data_key, 'Issue_Category', 'Issue', df_resolved)
             
             # Horizontal bar chart for issues
-            fig3 = px.bar(issue_counts.head(8), y='Issue', x='Count', orientation='h',
-                         color='Count', color_continuous_scale='Viridis')
-            fig3.update_layout(margin=dict(t=10, b=0, l=0, r=0), height=350)
+            def build_issue_bar():
+                fig = px.bar(issue_counts.head(8), y='Issue', x='Count', orientation='h',
+                             color='Count', color_continuous_scale='Viridis')
+                fig.update_layout(margin=dict(t=10, b=0, l=0, r=0), height=350)
+                return fig
+            
+            fig3 = cached_figure('issue_bar', issue_counts.head(8), build_issue_bar)
             st.plotly_chart(fig3, use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
@@ -224,24 +366,28 @@ if selected_page == "Overview":
             st.markdown('<div class="plot-container">', unsafe_allow_html=True)
             st.subheader("Resolution Time Analysis")
             
-            # Calculate resolution times
-            df_resolved['Resolution_Time_Hours'] = df_resolved.apply(
-                lambda row: get_resolution_time(row['Ticket_Open_Date'], row['Date_of_Resolution']), 
-                axis=1
-            )
-            
             # Remove any None values
             df_time = df_resolved.dropna(subset=['Resolution_Time_Hours'])
             
             # Team resolution time box plot
             if not df_time.empty:
-                fig4 = px.box(df_time, x='Assigned_To_Team', y='Resolution_Time_Hours', 
-                             color='Assigned_To_Team', points="all")
-                fig4.update_layout(
-                    margin=dict(t=10, b=0, l=0, r=0),
-                    xaxis_title="Team",
-                    yaxis_title="Resolution Time (Hours)",
-                    height=350
+                def build_resolution_box():
+                    # Cap the plotted sample so large datasets don't bloat the figure
+                    df_time_sample = df_time.sample(min(len(df_time), 2000), random_state=0)
+                    fig = px.box(df_time_sample, x='Assigned_To_Team', y='Resolution_Time_Hours', 
+                                 color='Assigned_To_Team', points="outliers")
+                    fig.update_layout(
+                        margin=dict(t=10, b=0, l=0, r=0),
+                        xaxis_title="Team",
+                        yaxis_title="Resolution Time (Hours)",
+                        height=350
+                    )
+                    return fig
+                
+                fig4 = cached_figure(
+                    'resolution_box',
+                    df_time[['Assigned_To_Team', 'Resolution_Time_Hours']],
+                    build_resolution_box
                 )
                 st.plotly_chart(fig4, use_container_width=True)
             else:
@@ -254,18 +400,28 @@ if selected_page == "Overview":
         
         # Try to extract dates and create time series
         try:
-            df_resolved['Date'] = pd.to_datetime(df_resolved['Ticket_Open_Date']).dt.date
-            date_counts = df_resolved.groupby('Date').size().reset_index(name='count')
-            date_counts['Date'] = pd.to_datetime(date_counts['Date'])
-            date_counts = date_counts.sort_values('Date')
+            open_days = df_resolved['_open_ts'].dt.floor('D')
+            date_counts = open_days.value_counts().sort_index().rename_axis('Date').reset_index(name='count')
+            
+            # Create area chart (WebGL trace so large date ranges stay cheap to render)
+            def build_trend_area():
+                fig = go.Figure(go.Scattergl(
+                    x=date_counts['Date'],
+                    y=date_counts['count'],
+                    mode='lines',
+                    fill='tozeroy',
+                    line=dict(color='#3B82F6', width=2)
+                ))
+                fig.update_layout(
+                    title="Tickets Opened by Date",
+                    xaxis_title="Date",
+                    yaxis_title="Number of Tickets",
+                    margin=dict(t=30, b=0, l=0, r=0),
+                    height=300
+                )
+                return fig
             
-            # Create area chart
-            fig5 = px.area(date_counts, x='Date', y='count', 
-                           title="Tickets Opened by Date",
-                           labels={"count": "Number of Tickets", "Date": "Date"},
-                           line_shape="spline", render_mode="svg")
-            fig5.update_traces(line_color='#3B82F6', fill='tozeroy', line=dict(width=2))
-            fig5.update_layout(margin=dict(t=30, b=0, l=0, r=0), height=300)
+            fig5 = cached_figure('trend_area', date_counts, build_trend_area)
             st.plotly_chart(fig5, use_container_width=True)
         except:
             st.info("Unable to generate time trends. Check date format in tickets.")
@@ -275,84 +431,28 @@ if selected_page == "Overview":
 elif selected_page == "Resolved Tickets":
     st.markdown('<p class="main-header">Resolved Tickets</p>', unsafe_allow_html=True)
     
-    resolved_tickets = ticket_system.get_all_resolved_tickets()
+    resolved_tickets = _load_resolved(ticket_system.version)
     
     if not resolved_tickets:
         st.info("No resolved tickets found.")
     else:
-        # Convert to DataFrame for display
-        df = pd.DataFrame(resolved_tickets)
-        
-        # Select only the columns we want to display
-        display_cols = [
-            'Ticket_ID', 'Issue_Category', 'Sentiment', 'Priority', 
-            'Solution', 'Ticket_Open_Date', 'Date_of_Resolution', 'Assigned_To_Team'
-        ]
-        
-        # Filter columns and sort by date
-        if all(col in df.columns for col in display_cols):
-            df_display = df[display_cols].sort_values('Date_of_Resolution', ascending=False)
-            st.dataframe(df_display, use_container_width=True, height=300)
-        else:
-            st.warning("Some expected columns are missing from the data")
-            st.dataframe(df, height=300)
+        # Convert only the displayed columns to a DataFrame
+        df = tickets_to_df(resolved_tickets, DISPLAY_COLS_RES)
+        by_id = {t['Ticket_ID']: t for t in resolved_tickets}
         
-        # Ticket selection for details
-        selected_ticket_id = st.selectbox(
-            "Select a ticket to view details:", 
-            options=[ticket['Ticket_ID'] for ticket in resolved_tickets]
+        # Sort by date
+        df_display = df.sort_values('Date_of_Resolution', ascending=False)
+        st.dataframe(
+            df_display.head(PREVIEW_N),
+            use_container_width=True,
+            height=300,
+            column_config={'Solution': st.column_config.TextColumn(width='small')}
         )
+        if len(df_display) > PREVIEW_N:
+            with st.expander("Show all"):
+                st.dataframe(df_display, use_container_width=True)
         
-        if selected_ticket_id:
-            ticket = ticket_system.get_ticket(selected_ticket_id)
-            if ticket:
-                st.markdown(f"<h3>Ticket Details: {selected_ticket_id}</h3>", unsafe_allow_html=True)
-                
-                # Calculate resolution time
-                resolution_time = get_resolution_time(
-                    ticket.get('Ticket_Open_Date'), 
-                    ticket.get('Date_of_Resolution')
-                )
-                
-                # Display ticket details with improved styling
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.markdown("<p class='stat-card'><b>Issue:</b> {}</p>".format(ticket.get('Issue_Category')), unsafe_allow_html=True)
-                    st.markdown("<p class='stat-card'><b>Priority:</b> {}</p>".format(ticket.get('Priority')), unsafe_allow_html=True)
-                    st.markdown("<p class='stat-card'><b>Team:</b> {}</p>".format(ticket.get('Assigned_To_Team')), unsafe_allow_html=True)
-                
-                with col2:
-                    st.markdown("<p class='stat-card'><b>Opened:</b> {}</p>".format(ticket.get('Ticket_Open_Date')), unsafe_allow_html=True)
-                    st.markdown("<p class='stat-card'><b>Resolved:</b> {}</p>".format(ticket.get('Date_of_Resolution')), unsafe_allow_html=True)
-                    if resolution_time:
-                        st.markdown("<p class='stat-card'><b>Resolution Time:</b> {} hours</p>".format(resolution_time), unsafe_allow_html=True)
-                
-                with col3:
-                    st.markdown("<p class='stat-card'><b>Sentiment:</b> {}</p>".format(ticket.get('Sentiment')), unsafe_allow_html=True)
-                    st.markdown("<p class='stat-card'><b>Status:</b> {}</p>".format(ticket.get('Resolution_Status')), unsafe_allow_html=True)
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-                # Display solution
-                st.subheader("Solution")
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                st.write(ticket.get('Solution', 'No solution recorded'))
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-                # Display conversation
-                st.subheader("Conversation")
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                
-                conversation = ticket.get('conversation', [])
-                for msg in conversation:
-                    if msg.get('role') == 'user':
-                        st.markdown(f"<b>User</b> ({msg.get('timestamp', 'N/A')}):", unsafe_allow_html=True)
-                        st.markdown(f"<div class='user-msg'>{msg.get('content')}</div>", unsafe_allow_html=True)
-                    else:
-                        st.markdown(f"<b>Assistant</b> ({msg.get('timestamp', 'N/A')}):", unsafe_allow_html=True)
-                        st.markdown(f"<div class='assistant-msg'>{msg.get('content')}</div>", unsafe_allow_html=True)
-                
-                st.markdown('</div>', unsafe_allow_html=True)
+        _ticket_detail_panel(by_id, resolved=True)
 
 # Similar enhancements for the remaining pages would follow the same pattern
 # The pattern includes using the card containers, better colors and layout
@@ -362,46 +462,43 @@ elif selected_page == "Resolved Tickets":
 elif selected_page == "Unresolved Tickets":
     st.markdown('<p class="main-header">Unresolved Tickets</p>', unsafe_allow_html=True)
     
-    unresolved_tickets = ticket_system.get_all_unresolved_tickets()
+    version = ticket_system.version
+    unresolved_tickets = _load_unresolved(version)
     
     if not unresolved_tickets:
         st.info("No unresolved tickets found.")
     else:
-        # Convert to DataFrame for display
-        df = pd.DataFrame(unresolved_tickets)
+        # Convert only the displayed columns to a DataFrame
+        df = tickets_to_df(unresolved_tickets, DISPLAY_COLS_UNRES)
+        by_id = {t['Ticket_ID']: t for t in unresolved_tickets}
+        data_key = ('unresolved', version)
         
-        # Select only the columns we want to display
-        display_cols = [
-            'Ticket_ID', 'Issue_Category', 'Sentiment', 'Priority', 
-            'Ticket_Open_Date', 'Assigned_To_Team', 'Status'
-        ]
+        # Sort by date
+        df_display = df.sort_values('Ticket_Open_Date', ascending=False)
         
-        # Filter columns and sort by date
-        if all(col in df.columns for col in display_cols):
-            df_display = df[display_cols].sort_values('Ticket_Open_Date', ascending=False)
-            
-            # Add time open column
-            now = datetime.now()
-            df_display['Hours_Open'] = df_display['Ticket_Open_Date'].apply(
-                lambda x: round((now - datetime.strptime(x, "%Y-%m-%d %H:%M:%S")).total_seconds() / 3600, 1)
-                if x and isinstance(x, str) else 0
-            )
-            
-            # Color code based on priority and time open
-            def highlight_priority(row):
-                if row['Priority'] == 'High':
-                    return ['background-color: #FECACA'] * len(row)
-                elif row['Priority'] == 'Medium':
-                    return ['background-color: #FEF3C7'] * len(row)
-                return [''] * len(row)
-            
-            styled_df = df_display.style.apply(highlight_priority, axis=1)
-            st.dataframe(styled_df, use_container_width=True, height=300)
-        else:
-            st.warning("Some expected columns are missing from the data")
-            st.dataframe(df, height=300)
+        # Add time open column
+        opened = pd.to_datetime(df_display['Ticket_Open_Date'], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+        df_display['Hours_Open'] = ((pd.Timestamp.now() - opened).dt.total_seconds() / 3600).round(1).fillna(0)
+        
+        # Color code based on priority, broadcasting one color per row across all columns
+        color_series = df_display['Priority'].astype(object).map({
+            'High': 'background-color: #FECACA',
+            'Medium': 'background-color: #FEF3C7'
+        }).fillna('')
+        
+        def highlight_priority(frame):
+            colors = np.broadcast_to(color_series.loc[frame.index].values[:, None], frame.shape)
+            return pd.DataFrame(colors, index=frame.index, columns=frame.columns)
+        
+        styled_df = df_display.head(PREVIEW_N).style.apply(highlight_priority, axis=None)
+        st.dataframe(styled_df, use_container_width=True, height=300)
+        if len(df_display) > PREVIEW_N:
+            with st.expander("Show all"):
+                st.dataframe(df_display.style.apply(highlight_priority, axis=None), use_container_width=True)
         
         # Add visualization of unresolved tickets
+        import plotly.express as px
+        
         st.markdown('<div class="plot-container">', unsafe_allow_html=True)
         st.subheader("Unresolved Tickets Analysis")
         
@@ -409,118 +506,44 @@ elif selected_page == "Unresolved Tickets":
         
         with chart_col1:
             # Priority distribution
-            priority_counts = df['Priority'].value_counts().reset_index()
-            priority_counts.columns = ['Priority', 'Count']
+            priority_counts = count_by(data_key, 'Priority', 'Priority', df)
             
             colors = {'High': '#EF4444', 'Medium': '#F59E0B', 'Low': '#10B981'}
             color_discrete_map = {p: colors.get(p, '#3B82F6') for p in priority_counts['Priority']}
             
-            fig1 = px.pie(priority_counts, values='Count', names='Priority',
-                          title="Tickets by Priority",
-                          color='Priority', color_discrete_map=color_discrete_map)
-            fig1.update_traces(textposition='inside', textinfo='percent+label')
-            fig1.update_layout(margin=dict(t=30, b=0, l=0, r=0), height=350)
+            def build_priority_pie():
+                fig = px.pie(priority_counts, values='Count', names='Priority',
+                             title="Tickets by Priority",
+                             color='Priority', color_discrete_map=color_discrete_map)
+                fig.update_traces(textposition='inside', textinfo='percent+label')
+                fig.update_layout(margin=dict(t=30, b=0, l=0, r=0), height=350)
+                return fig
+            
+            fig1 = cached_figure('unresolved_priority_pie', priority_counts, build_priority_pie)
             st.plotly_chart(fig1, use_container_width=True)
         
         with chart_col2:
             # Team distribution
-            team_counts = df['Assigned_To_Team'].value_counts().reset_index()
-            team_counts.columns = ['Team', 'Count']
+            team_counts = count_by(data_key, 'Assigned_To_Team', 'Team', df)
+            
+            def build_team_bar():
+                fig = px.bar(
+                    team_counts, 
+                    x='Team', 
+                    y='Count',
+                    title="Tickets by Team",
+                    color='Count',
+                    color_continuous_scale='Blues'
+                )
+                fig.update_layout(margin=dict(t=30, b=0, l=0, r=0), height=350)
+                return fig
             
-            fig2 = px.bar(
-                team_counts, 
-                x='Team', 
-                y='Count',
-                title="Tickets by Team",
-                color='Count',
-                color_continuous_scale='Blues'
-            )
-            fig2.update_layout(margin=dict(t=30, b=0, l=0, r=0), height=350)
+            fig2 = cached_figure('unresolved_team_bar', team_counts, build_team_bar)
             st.plotly_chart(fig2, use_container_width=True)
         
         st.markdown('</div>', unsafe_allow_html=True)
         
-        # Ticket selection for details
-        selected_ticket_id = st.selectbox(
-            "Select a ticket to view details:", 
-            options=[ticket['Ticket_ID'] for ticket in unresolved_tickets]
-        )
-        
-        if selected_ticket_id:
-            ticket = ticket_system.get_ticket(selected_ticket_id)
-            if ticket:
-                st.markdown(f"<h3>Ticket Details: {selected_ticket_id}</h3>", unsafe_allow_html=True)
-                
-                # Calculate time open
-                time_open = None
-                if ticket.get('Ticket_Open_Date'):
-                    try:
-                        open_dt = datetime.strptime(ticket.get('Ticket_Open_Date'), "%Y-%m-%d %H:%M:%S")
-                        delta = datetime.now() - open_dt
-                        time_open = round(delta.total_seconds() / 3600, 1)
-                    except Exception as e:
-                        pass
-                
-                # Display ticket details with improved styling
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.markdown("<p class='stat-card'><b>Issue:</b> {}</p>".format(ticket.get('Issue_Category')), unsafe_allow_html=True)
-                    st.markdown("<p class='stat-card'><b>Priority:</b> {}</p>".format(ticket.get('Priority')), unsafe_allow_html=True)
-                    st.markdown("<p class='stat-card'><b>Team:</b> {}</p>".format(ticket.get('Assigned_To_Team')), unsafe_allow_html=True)
-                
-                with col2:
-                    st.markdown("<p class='stat-card'><b>Opened:</b> {}</p>".format(ticket.get('Ticket_Open_Date')), unsafe_allow_html=True)
-                    if time_open:
-                        st.markdown("<p class='stat-card'><b>Time Open:</b> {} hours</p>".format(time_open), unsafe_allow_html=True)
-                    st.markdown("<p class='stat-card'><b>Status:</b> {}</p>".format(ticket.get('Status', 'Unresolved')), unsafe_allow_html=True)
-                
-                with col3:
-                    st.markdown("<p class='stat-card'><b>Sentiment:</b> {}</p>".format(ticket.get('Sentiment')), unsafe_allow_html=True)
-                    
-                    # Add action buttons for ticket management
-                    if st.button("Mark as Resolved", key=f"resolve_{selected_ticket_id}"):
-                        ticket_system.resolve_ticket(
-                            ticket_id=selected_ticket_id,
-                            resolution_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            solution="Resolved by admin"
-                        )
-                        st.success(f"Ticket {selected_ticket_id} marked as resolved!")
-                        st.rerun()
-                
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-                # Display conversation
-                st.subheader("Conversation")
-                st.markdown('<div class="card">', unsafe_allow_html=True)
-                
-                conversation = ticket.get('conversation', [])
-                for msg in conversation:
-                    if msg.get('role') == 'user':
-                        st.markdown(f"<b>User</b> ({msg.get('timestamp', 'N/A')}):", unsafe_allow_html=True)
-                        st.markdown(f"<div class='user-msg'>{msg.get('content')}</div>", unsafe_allow_html=True)
-                    else:
-                        st.markdown(f"<b>Assistant</b> ({msg.get('timestamp', 'N/A')}):", unsafe_allow_html=True)
-                        st.markdown(f"<div class='assistant-msg'>{msg.get('content')}</div>", unsafe_allow_html=True)
-                
-                # Add a form to respond to the ticket
-                with st.form(key=f"respond_form_{selected_ticket_id}"):
-                    response_text = st.text_area("Add a response to this ticket")
-                    submit_button = st.form_submit_button(label="Send Response")
-                    
-                    if submit_button and response_text:
-                        # Add the response to the conversation
-                        new_msg = {
-                            "role": "assistant",
-                            "content": response_text,
-                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        }
-                        
-                        ticket_system.add_message_to_ticket(selected_ticket_id, new_msg)
-                        st.success("Response added successfully!")
-                        st.rerun()
-                
-                st.markdown('</div>', unsafe_allow_html=True)
+        _ticket_detail_panel(by_id, resolved=False)
     
 elif selected_page == "Conversation Viewer":
     st.markdown('<p class="main-header">Conversation Viewer</p>', unsafe_allow_html=True)
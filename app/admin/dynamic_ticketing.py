@@ -1,170 +1,359 @@
 import os
 import json
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
-from tinydb import TinyDB, Query
 import pandas as pd
 import uuid
 
+def _close_connection(conn, lock):
+    """Flush pending WAL pages and close a ticket store connection"""
+    with lock:
+        try:
+            conn.execute("PRAGMA optimize")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass  # already closed
+
+def timestamp_now():
+    """Current local time as 'YYYY-MM-DD HH:MM:SS' (f-string formatting is cheaper than strftime)"""
+    t = datetime.now()
+    return f"{t.year:04d}-{t.month:02d}-{t.day:02d} {t.hour:02d}:{t.minute:02d}:{t.second:02d}"
+
+# Ticket dict keys (as used by the apps) mapped to their SQLite columns
+TICKET_COLUMNS = {
+    "Ticket_ID": "ticket_id",
+    "Issue_Category": "issue_category",
+    "Sentiment": "sentiment",
+    "Priority": "priority",
+    "Solution": "solution",
+    "Resolution_Status": "status",
+    "Ticket_Open_Date": "open_date",
+    "Date_of_Resolution": "resolve_date",
+    "Assigned_To_Team": "team",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id TEXT PRIMARY KEY,
+    issue_category TEXT,
+    sentiment TEXT,
+    priority TEXT,
+    solution TEXT,
+    status TEXT,
+    open_date TEXT,
+    resolve_date TEXT,
+    team TEXT,
+    is_resolved INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_resolved ON tickets(is_resolved);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id TEXT NOT NULL REFERENCES tickets(ticket_id),
+    role TEXT,
+    content TEXT,
+    ts TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_msg_ticket ON messages(ticket_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+-- Append-only full-text index: one row per ticket insert, appended message and resolution
+CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+    ticket_id UNINDEXED,
+    issue_category,
+    solution,
+    conversation,
+    tokenize='porter unicode61'
+);
+"""
+
+def fts_query(query_text):
+    """Quote free text as a single FTS5 phrase whose last word also matches as a prefix"""
+    return '"' + query_text.replace('"', '""') + '"*'
+
 class DynamicTicketing:
-    def __init__(self, db_path="admin/ticket_db.json"):
-        """Initialize TinyDB for ticket storage with separate tables for resolved and unresolved tickets"""
-        self.db = TinyDB(db_path)
-        self.resolved_table = self.db.table('resolved')
-        self.unresolved_table = self.db.table('unresolved')
-        self.Ticket = Query()
+    def __init__(self, db_path="admin/ticket_db.sqlite3", legacy_json_path="admin/ticket_db.json"):
+        """Initialize SQLite ticket storage with indexed ticket and message tables"""
+        self.db_path = db_path
+        # Autocommit mode; writes are grouped explicitly with _transaction()
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._writes = 0
+        # Closed when the store is garbage-collected or at exit; the finalizer only references
+        # the connection, so it doesn't keep the store itself alive
+        self._finalizer = weakref.finalize(self, _close_connection, self.conn, self._lock)
+        
+        # Databases created before the full-text index existed get a one-time backfill
+        has_index = self.conn.execute("SELECT 1 FROM tickets_fts LIMIT 1").fetchone()
+        if not has_index:
+            self._backfill_fts()
+        
+        # Import tickets from the old TinyDB JSON file on first run
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            has_tickets = self.conn.execute("SELECT 1 FROM tickets LIMIT 1").fetchone()
+            if not has_tickets:
+                self._import_legacy_json(legacy_json_path)
+        
+        # Seed the ticket counter from existing IDs the first time
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT MAX(CAST(SUBSTR(ticket_id, 6) AS INTEGER)) FROM tickets WHERE ticket_id LIKE 'TECH\\_%' ESCAPE '\\'"
+            ).fetchone()
+            next_num = row[0] + 1 if row[0] is not None else 200
+            self.conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('next_tech_id', ?)", (next_num,)
+            )
+    
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed statements in a single write transaction"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+    
+    def flush(self):
+        """Checkpoint the write-ahead log into the main database file"""
+        with self._lock:
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    
+    def close(self):
+        """Flush pending WAL pages and close the connection (also runs on collection and at exit)"""
+        self._finalizer()
+    
+    def _import_legacy_json(self, json_path):
+        """Copy resolved and unresolved tickets from a TinyDB JSON file"""
+        with open(json_path) as f:
+            data = json.load(f)
+        
+        with self._transaction():
+            for table_name, is_resolved in (("unresolved", 0), ("resolved", 1)):
+                for ticket in data.get(table_name, {}).values():
+                    self._insert_ticket(ticket, is_resolved)
+                    self.conn.executemany(
+                        "INSERT INTO messages (ticket_id, role, content, ts) VALUES (?, ?, ?, ?)",
+                        [(ticket["Ticket_ID"], m.get("role"), m.get("content"), m.get("timestamp"))
+                         for m in ticket.get("conversation", [])]
+                    )
+    
+    def _backfill_fts(self):
+        """Index every stored ticket in the full-text table"""
+        with self._transaction():
+            for ticket in self._fetch_tickets("1 = 1"):
+                self._index_ticket(ticket)
+    
+    def _index_ticket(self, ticket):
+        """Add a full-text row for a ticket dict: issue, solution and every message"""
+        self.conn.execute(
+            "INSERT INTO tickets_fts (ticket_id, issue_category, solution, conversation) VALUES (?, ?, ?, ?)",
+            (
+                ticket["Ticket_ID"],
+                ticket.get("Issue_Category"),
+                ticket.get("Solution"),
+                "\n".join(m.get("content") or "" for m in ticket.get("conversation", []))
+            )
+        )
+    
+    def _insert_ticket(self, ticket, is_resolved=0):
+        """Insert a ticket row from a ticket dict and index its text"""
+        columns = list(TICKET_COLUMNS.values()) + ["is_resolved"]
+        values = [ticket.get(key) for key in TICKET_COLUMNS] + [is_resolved]
+        self.conn.execute(
+            f"INSERT INTO tickets ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            values
+        )
+        self._index_ticket(ticket)
+    
+    def _fetch_tickets(self, where, params=()):
+        """Fetch ticket dicts (with conversations) for tickets matching a WHERE clause on alias t"""
+        # The connection is shared across threads; reading under the lock keeps other threads'
+        # open write transactions invisible
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT t.* FROM tickets t WHERE {where} ORDER BY t.is_resolved, t.rowid", params
+            ).fetchall()
+            
+            tickets = {}
+            for row in rows:
+                ticket = {key: row[column] for key, column in TICKET_COLUMNS.items()}
+                ticket["conversation"] = []
+                tickets[ticket["Ticket_ID"]] = ticket
+            
+            if tickets:
+                messages = self.conn.execute(
+                    f"SELECT m.ticket_id, m.role, m.content, m.ts FROM messages m "
+                    f"JOIN tickets t ON t.ticket_id = m.ticket_id WHERE {where} ORDER BY m.id",
+                    params
+                )
+                for msg in messages:
+                    ticket = tickets.get(msg["ticket_id"])
+                    if ticket is not None:
+                        ticket["conversation"].append({
+                            "role": msg["role"],
+                            "content": msg["content"],
+                            "timestamp": msg["ts"]
+                        })
+            return list(tickets.values())
+    
+    @property
+    def version(self):
+        """Change marker for cache keys, updated on every write by this or any other connection"""
+        with self._lock:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            return (self._writes, data_version)
     
     def create_new_ticket(self, issue_summary, sentiment, priority, assigned_team):
         """Create a new ticket and return the ticket ID"""
-        # Generate unique ticket ID starting with TECH_
-        all_tickets = self.resolved_table.all() + self.unresolved_table.all()
-        ticket_numbers = []
-        
-        for ticket in all_tickets:
-            if 'Ticket_ID' in ticket and ticket['Ticket_ID'].startswith('TECH_'):
-                try:
-                    num = int(ticket['Ticket_ID'].replace('TECH_', ''))
-                    ticket_numbers.append(num)
-                except ValueError:
-                    pass
-        
-        # Generate next ticket number
-        next_num = max(ticket_numbers) + 1 if ticket_numbers else 200
-        ticket_id = f"TECH_{next_num}"
-        
-        # Create new ticket record
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        new_ticket = {
-            "Ticket_ID": ticket_id,
-            "Issue_Category": issue_summary,
-            "Sentiment": sentiment,
-            "Priority": priority,
-            "Solution": "",  # Will be filled when resolved
-            "Resolution_Status": "Open",
-            "Ticket_Open_Date": current_time,
-            "Date_of_Resolution": None,
-            "Assigned_To_Team": assigned_team,
-            "conversation": []  # Will be updated as the conversation progresses
-        }
-        
-        # Insert into unresolved table
-        self.unresolved_table.insert(new_ticket)
+        return self.create_new_ticket_with_messages(issue_summary, sentiment, priority, assigned_team, [])
+    
+    def create_new_ticket_with_messages(self, issue_summary, sentiment, priority, assigned_team, messages, ts=None):
+        """Create a new ticket with its first {"role", "content"} messages in one write and return the ticket ID"""
+        current_time = ts or timestamp_now()
+        
+        with self._transaction():
+            # Generate unique ticket ID starting with TECH_ from the persisted counter
+            next_num = self.conn.execute("SELECT value FROM meta WHERE key = 'next_tech_id'").fetchone()[0]
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'next_tech_id'", (next_num + 1,))
+            ticket_id = f"TECH_{next_num}"
+            
+            # Create new ticket record
+            self._insert_ticket({
+                "Ticket_ID": ticket_id,
+                "Issue_Category": issue_summary,
+                "Sentiment": sentiment,
+                "Priority": priority,
+                "Solution": "",  # Will be filled when resolved
+                "Resolution_Status": "Open",
+                "Ticket_Open_Date": current_time,
+                "Date_of_Resolution": None,
+                "Assigned_To_Team": assigned_team
+            })
+            self._insert_messages(ticket_id, messages, current_time)
+            self._writes += 1
+        
         return ticket_id
     
-    def update_conversation(self, ticket_id, message, role="user"):
+    def update_conversation(self, ticket_id, message, role="user", ts=None):
         """Add a new message to the conversation history for a ticket"""
-        # Check unresolved first, then resolved
-        ticket = self.unresolved_table.get(self.Ticket.Ticket_ID == ticket_id)
-        table = self.unresolved_table
+        return self.add_messages(ticket_id, [{"role": role, "content": message}], ts)
+    
+    def add_messages(self, ticket_id, messages, ts=None):
+        """Add several {"role", "content"} messages to a ticket's conversation in one write"""
+        if not messages:
+            return True
         
-        if not ticket:
-            ticket = self.resolved_table.get(self.Ticket.Ticket_ID == ticket_id)
-            table = self.resolved_table
-            
-        if not ticket:
+        with self._transaction():
+            inserted = self._insert_messages(ticket_id, messages, ts or timestamp_now())
+            if inserted:
+                self._writes += 1
+        
+        if not inserted:
             print(f"Ticket {ticket_id} not found")
             return False
         
-        # Update conversation
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        new_message = {
-            "role": role,
-            "content": message,
-            "timestamp": current_time
-        }
-        
-        # Get current conversation
-        conversation = ticket.get('conversation', [])
-        conversation.append(new_message)
-        
-        # Update the ticket with the new conversation
-        table.update({"conversation": conversation}, self.Ticket.Ticket_ID == ticket_id)
         return True
     
-    def mark_as_resolved(self, ticket_id, solution):
-        """Mark a ticket as resolved and move it to the resolved table"""
-        # Find the ticket in the unresolved table
-        ticket = self.unresolved_table.get(self.Ticket.Ticket_ID == ticket_id)
+    def _insert_messages(self, ticket_id, messages, current_time):
+        """Append messages to a ticket (if it exists) and index them; returns the number inserted"""
+        rows = [
+            (m.get("role", "user"), m["content"], m.get("timestamp") or current_time, ticket_id)
+            for m in messages
+        ]
+        if not rows:
+            return 0
         
-        if not ticket:
+        # Append the messages only if the ticket exists, in a single statement each
+        inserted = self.conn.executemany(
+            "INSERT INTO messages (ticket_id, role, content, ts) "
+            "SELECT ticket_id, ?, ?, ? FROM tickets WHERE ticket_id = ?",
+            rows
+        ).rowcount
+        if inserted:
+            self.conn.execute(
+                "INSERT INTO tickets_fts (ticket_id, conversation) VALUES (?, ?)",
+                (ticket_id, "\n".join(m["content"] for m in messages))
+            )
+        return inserted
+    
+    def mark_as_resolved(self, ticket_id, solution, ts=None):
+        """Mark a ticket as resolved"""
+        current_time = ts or timestamp_now()
+        
+        with self._transaction():
+            updated = self.conn.execute(
+                "UPDATE tickets SET status = 'Resolved', resolve_date = ?, solution = ?, is_resolved = 1 "
+                "WHERE ticket_id = ? AND is_resolved = 0",
+                (current_time, solution, ticket_id)
+            ).rowcount
+            if updated:
+                self.conn.execute(
+                    "INSERT INTO tickets_fts (ticket_id, solution) VALUES (?, ?)", (ticket_id, solution)
+                )
+                self._writes += 1
+        
+        if not updated:
             print(f"Unresolved ticket {ticket_id} not found")
             return False
         
-        # Update resolution information
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ticket["Resolution_Status"] = "Resolved"
-        ticket["Date_of_Resolution"] = current_time
-        ticket["Solution"] = solution
-        
-        # Add to resolved table and remove from unresolved
-        self.resolved_table.insert(ticket)
-        self.unresolved_table.remove(self.Ticket.Ticket_ID == ticket_id)
         return True
     
     def flag_for_human_agent(self, ticket_id):
-        """Flag a ticket as needing human assistance without moving it between tables"""
-        # Check unresolved first, then resolved (though it should always be in unresolved)
-        ticket = self.unresolved_table.get(self.Ticket.Ticket_ID == ticket_id)
-        table = self.unresolved_table
-        
-        if not ticket:
-            ticket = self.resolved_table.get(self.Ticket.Ticket_ID == ticket_id)
-            table = self.resolved_table
-            
-        if not ticket:
+        """Flag a ticket as needing human assistance without changing its resolved state"""
+        with self._transaction():
+            updated = self.conn.execute(
+                "UPDATE tickets SET status = 'Needs Human Agent' WHERE ticket_id = ?", (ticket_id,)
+            ).rowcount
+            if updated:
+                self._writes += 1
+        
+        if not updated:
             print(f"Ticket {ticket_id} not found")
             return False
         
-        # Update ticket status to indicate it needs human assistance
-        table.update({"Resolution_Status": "Needs Human Agent"}, self.Ticket.Ticket_ID == ticket_id)
         return True
     
     def get_ticket(self, ticket_id):
         """Get ticket data for a specific ticket ID"""
-        # Check unresolved first, then resolved
-        ticket = self.unresolved_table.get(self.Ticket.Ticket_ID == ticket_id)
-        
-        if not ticket:
-            ticket = self.resolved_table.get(self.Ticket.Ticket_ID == ticket_id)
-            
-        return ticket
+        tickets = self._fetch_tickets("t.ticket_id = ?", (ticket_id,))
+        return tickets[0] if tickets else None
     
     def get_all_resolved_tickets(self):
         """Get all resolved tickets"""
-        return self.resolved_table.all()
+        return self._fetch_tickets("t.is_resolved = 1")
     
     def get_all_unresolved_tickets(self):
         """Get all unresolved tickets"""
-        return self.unresolved_table.all()
+        return self._fetch_tickets("t.is_resolved = 0")
     
     def search_tickets(self, query_text, include_resolved=True, include_unresolved=True):
         """Search tickets based on text"""
-        results = []
-        
-        # Function to check if query text appears in ticket data
-        def contains_query(ticket):
-            if query_text.lower() in ticket.get('Issue_Category', '').lower():
-                return True
-            if query_text.lower() in ticket.get('Solution', '').lower():
-                return True
-            # Check conversation
-            for msg in ticket.get('conversation', []):
-                if query_text.lower() in msg.get('content', '').lower():
-                    return True
-            return False
-        
-        # Search in unresolved tickets
-        if include_unresolved:
-            for ticket in self.unresolved_table.all():
-                if contains_query(ticket):
-                    results.append(ticket)
+        states = [state for state, included in ((0, include_unresolved), (1, include_resolved)) if included]
+        if not states:
+            return []
         
-        # Search in resolved tickets
-        if include_resolved:
-            for ticket in self.resolved_table.all():
-                if contains_query(ticket):
-                    results.append(ticket)
+        if not query_text.strip():
+            return []
         
-        return results
+        # Indexed full-text match on the issue, solution or any message
+        where = (
+            f"t.is_resolved IN ({', '.join('?' * len(states))}) "
+            "AND t.ticket_id IN (SELECT ticket_id FROM tickets_fts WHERE tickets_fts MATCH ?)"
+        )
+        return self._fetch_tickets(where, states + [fts_query(query_text)])
 
 # Example usage:
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+from dynamic_ticketing import timestamp_now
+
+# Handlers behind the admin view's ticket buttons, kept free of Streamlit so they can be tested
+
+def resolve_by_admin(ticket_system, ticket_id, solution="Resolved by admin"):
+    """Mark an open ticket as resolved; returns False if it is missing or already resolved"""
+    return ticket_system.mark_as_resolved(ticket_id, solution, ts=timestamp_now())
+
+def add_admin_response(ticket_system, ticket_id, response_text):
+    """Append an assistant response to a ticket's conversation; returns False if the ticket is missing"""
+    return ticket_system.add_messages(ticket_id, [{"role": "assistant", "content": response_text}])
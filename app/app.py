@@ -2,16 +2,15 @@ import streamlit as st
 import pandas as pd
 import os
 import json
-from datetime import datetime
 import uuid
 import math
+import heapq
+import functools
+from collections import deque
+from itertools import islice
 
-# Import custom modules (relative imports from current package)
-from get_response import OpenAIClient
-from chroma_agent import ChromaAgent
-from assign_agent import AssignAgent
-from summarization_agent import SummarizationAgent
-from admin.dynamic_ticketing import DynamicTicketing  # Fixed import path
+# Import custom modules (relative imports from current package; agent modules are imported by their factories)
+from admin.dynamic_ticketing import DynamicTicketing, timestamp_now  # Fixed import path
 from prompts import followup_agent_prompt
 
 # Set page config
@@ -21,7 +20,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# Function to format time nicely
+# Function to format time nicely (pure, so memoized across reruns)
+@functools.lru_cache(maxsize=128)
 def format_time(hours):
     """Format time in a user-friendly way - use days if over 24 hours"""
     if hours >= 24:
@@ -30,25 +30,107 @@ def format_time(hours):
     else:
         return f"{math.ceil(hours)} hours"
 
+# Function to get the estimated resolution time for the current assignment
+def get_resolution_estimate():
+    """Return (est_hours, formatted_time), cached in session state per assignment result"""
+    assignment_result = st.session_state.assignment_result
+    cached = st.session_state.get("_cached_resolution_time")
+    if cached is not None and cached[0] is assignment_result:
+        return cached[1], cached[2]
+    
+    if assignment_result:
+        if assignment_result["source"] == "historical_data":
+            est_hours = assignment_result['estimated_resolution_hours']
+        else:
+            est_hours = assignment_result.get('estimated_resolution_hours', 24)
+    else:
+        est_hours = 24  # default
+    
+    formatted_time = format_time(est_hours)
+    st.session_state._cached_resolution_time = (assignment_result, est_hours, formatted_time)
+    return est_hours, formatted_time
+
+# The follow-up prompt is static, so build it once per process
+@functools.lru_cache(maxsize=1)
+def get_followup_prompt():
+    """Return the shared follow-up prompt object"""
+    return followup_agent_prompt()
+
+# Agent factories: process-wide singletons built on first use, so the landing page
+# doesn't pay for loading the embedding model or importing the agent modules
+@st.cache_resource
+def get_ticket_system():
+    return DynamicTicketing()
+
+@st.cache_resource
+def get_openai_client():
+    from get_response import OpenAIClient
+    return OpenAIClient()
+
+@st.cache_resource
+def get_chroma_agent():
+    from chroma_agent import ChromaAgent
+    chroma_agent = ChromaAgent()
+    
+    # Preload historical data if needed
+    try:
+        # Check if we need to load data (peeking one id is cheaper than a full count)
+        is_empty = not chroma_agent.collection.peek(limit=1)["ids"]
+        if is_empty:
+            print("No data in ChromaDB, loading historical data...")
+            # Try to load data from the expected location
+            csv_path = "app/chat_history/historical_ticket_new.csv"
+            if os.path.exists(csv_path):
+                records = chroma_agent.load_data_from_csv(csv_path)
+                print(f"Loaded {records} records into ChromaDB")
+            else:
+                print(f"Warning: Historical data file not found at {csv_path}")
+        else:
+            print("ChromaDB already contains documents")
+    except Exception as e:
+        print(f"Error preloading data: {str(e)}")
+    return chroma_agent
+
+@st.cache_resource
+def get_summarization_agent():
+    from summarization_agent import SummarizationAgent
+    return SummarizationAgent(get_openai_client())
+
+@st.cache_resource
+def get_assign_agent():
+    from assign_agent import AssignAgent
+    return AssignAgent(get_openai_client(), get_chroma_agent(), get_summarization_agent())
+
+# Function to record a chat message
+def append_chat_message(msg):
+    """Append a message to the chat history, keeping the user/assistant view in sync"""
+    st.session_state.chat_history.append(msg)
+    if msg["role"] in ("user", "assistant"):
+        st.session_state.ua_messages.append(msg)
+
 # Function to handle chat message submission
 def handle_chat_message():
     message = st.session_state.chat_input
     if not message:
         return
     
+    # One timestamp for everything recorded during this turn
+    now_str = timestamp_now()
+    
     # Add user message to chat history
-    st.session_state.chat_history.append({
+    append_chat_message({
         "role": "user",
         "content": message,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "timestamp": now_str
     })
     
-    # Also update the conversation in TinyDB if we have a ticket ID
+    # Also update the conversation in the ticket store if we have a ticket ID
     if "ticket_id" in st.session_state and st.session_state.ticket_id:
         st.session_state.ticket_system.update_conversation(
             st.session_state.ticket_id, 
             message, 
-            "user"
+            "user",
+            ts=now_str
         )
     
     # Check if this is a follow-up question
@@ -56,90 +138,63 @@ def handle_chat_message():
     
     if is_followup:
         # Handle follow-up question
-        handle_followup_question(message)
+        handle_followup_question(message, now_str)
     else:
         # Handle initial question
-        handle_initial_question(message)
+        handle_initial_question(message, now_str)
 
-def handle_initial_question(message):
+def handle_initial_question(message, now_str):
     """Process an initial question from the user"""
-    # 1. Summarize the issue
-    with st.spinner("Analyzing issue..."):
-        summary_result = st.session_state.summarization_agent.summarize_issue(message)
+    # Summarize the issue, find similar issues and assign a team. process_and_assign does it
+    # with one combined LLM call, overlapped with a search on the raw text, and returns the top
+    # 5 matches of its single search for display
+    with st.spinner("Analyzing issue and assigning team..."):
+        assignment_result = get_assign_agent().process_and_assign(message, n_results=3, n_similar=5)
+        summary_result = {
+            "summary": assignment_result.get("summary") or message,
+            "sentiment": assignment_result.get("sentiment") or "Unknown",
+            "priority": assignment_result.get("priority") or "Medium",
+            "solution": assignment_result.get("solution") or "Could not generate solution."
+        }
         st.session_state.issue_summary = summary_result
         st.session_state.initial_question = message
-    
-    # 2. Find similar issues using ChromaDB
-    with st.spinner("Finding similar issues..."):
-        similar_issues = st.session_state.chroma_agent.query(summary_result["summary"], n_results=5)
-        st.session_state.similar_issues = similar_issues
-    
-    # 3. Assign team and estimate resolution time
-    with st.spinner("Assigning team..."):
-        # Simple context for initial questions
-        api_chat_history = [
-            {"role": "system", "content": f"The user's issue has been summarized as: '{summary_result['summary']}'."}
-        ]
-        
-        assignment_result = st.session_state.assign_agent.process_and_assign(
-            message,
-            chat_history=api_chat_history,
-            n_results=3
-        )
         st.session_state.assignment_result = assignment_result
-    
-    # Create a ticket ID for this conversation
-    with st.spinner("Creating ticket..."):
-        # Create a ticket in the ticketing system
-        if "ticket_id" not in st.session_state or not st.session_state.ticket_id:
-            ticket_id = st.session_state.ticket_system.create_new_ticket(
-                issue_summary=summary_result["summary"],
-                sentiment=summary_result["sentiment"],
-                priority=summary_result["priority"],
-                assigned_team=assignment_result.get("assigned_team", "Support")
-            )
-            st.session_state.ticket_id = ticket_id
-            
-            # Add both the user message and initial response to the ticket
-            st.session_state.ticket_system.update_conversation(
-                ticket_id, 
-                message, 
-                "user"
-            )
+        st.session_state.similar_issues = assignment_result["search_results"]
     
     # Add system response to chat history
-    if st.session_state.assignment_result["source"] == "historical_data":
-        resolution_hours = st.session_state.assignment_result['estimated_resolution_hours']
-        formatted_time = format_time(resolution_hours)
-        response_content = (
-            f"I've analyzed your issue which appears to be about '{summary_result['summary']}'. "
-            f"Here's a suggested solution: {summary_result['solution']}\n\n"
-            f"Estimated resolution time: {formatted_time}\n\n"
-            f"Is this helpful? If not, I can create a support ticket for you."
-        )
-    else:  # LLM source
-        resolution_hours = st.session_state.assignment_result.get('estimated_resolution_hours', 24)
-        formatted_time = format_time(resolution_hours)
-        response_content = (
-            f"I've analyzed your issue which appears to be about '{summary_result['summary']}'. "
-            f"Here's a suggested solution: {summary_result['solution']}\n\n"
-            f"Estimated resolution time: {formatted_time}\n\n"
-            f"Is this helpful? If not, I can create a support ticket for you."
-        )
+    _, formatted_time = get_resolution_estimate()
+    response_content = (
+        f"I've analyzed your issue which appears to be about '{summary_result['summary']}'. "
+        f"Here's a suggested solution: {summary_result['solution']}\n\n"
+        f"Estimated resolution time: {formatted_time}\n\n"
+        f"Is this helpful? If not, I can create a support ticket for you."
+    )
     
     # Add the assistant response to chat history
-    st.session_state.chat_history.append({
+    append_chat_message({
         "role": "assistant",
         "content": response_content,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "timestamp": now_str
     })
     
-    # Also update the conversation in TinyDB
-    if "ticket_id" in st.session_state and st.session_state.ticket_id:
-        st.session_state.ticket_system.update_conversation(
+    # Record the exchange in the ticket store in a single write
+    assistant_message = {"role": "assistant", "content": response_content}
+    if "ticket_id" not in st.session_state or not st.session_state.ticket_id:
+        with st.spinner("Creating ticket..."):
+            # handle_chat_message ran before the ticket existed, so the user message goes in with it
+            st.session_state.ticket_id = st.session_state.ticket_system.create_new_ticket_with_messages(
+                issue_summary=summary_result["summary"],
+                sentiment=summary_result["sentiment"],
+                priority=summary_result["priority"],
+                assigned_team=assignment_result.get("assigned_team", "Support"),
+                messages=[{"role": "user", "content": message}, assistant_message],
+                ts=now_str
+            )
+    else:
+        st.session_state.ticket_system.add_messages(
             st.session_state.ticket_id,
-            response_content,
-            "assistant"
+            [assistant_message],
+            ts=now_str
         )
     
     # Update the issue analysis panel
@@ -151,7 +206,7 @@ def handle_initial_question(message):
     # Extract common solutions to display on the left
     extract_common_solutions()
     
-def handle_followup_question(message):
+def handle_followup_question(message, now_str):
     """Process a follow-up question using context from previous interactions"""
     with st.spinner("Processing your follow-up question..."):
         # Get last 3 conversations for context
@@ -168,7 +223,7 @@ def handle_followup_question(message):
             assigned_team = "support"
         
         # Create the follow-up prompt
-        followup_prompt = followup_agent_prompt()
+        followup_prompt = get_followup_prompt()
         user_prompt = followup_prompt.user_prompt.format(
             conversation_summary=conversation_summary,
             initial_question=st.session_state.initial_question,
@@ -179,25 +234,26 @@ def handle_followup_question(message):
         )
         
         # Get response from LLM for follow-up
-        followup_response = st.session_state.openai_client.get_response(
+        followup_response = get_openai_client().get_response(
             user_prompt, 
             followup_prompt.system_prompt, 
             []  # No chat history needed as context is in the prompt
         )
         
         # Add response to chat history
-        st.session_state.chat_history.append({
+        append_chat_message({
             "role": "assistant",
             "content": followup_response,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "timestamp": now_str
         })
         
-        # Also update the conversation in TinyDB
+        # Also update the conversation in the ticket store
         if "ticket_id" in st.session_state and st.session_state.ticket_id:
             st.session_state.ticket_system.update_conversation(
                 st.session_state.ticket_id,
                 followup_response,
-                "assistant"
+                "assistant",
+                ts=now_str
             )
 
 def mark_resolved():
@@ -207,30 +263,33 @@ def mark_resolved():
     
     # Add resolution message to chat history
     resolution_message = "Great! I'm glad I could help solve your issue. Is there anything else you need help with?"
-    st.session_state.chat_history.append({
+    now_str = timestamp_now()
+    append_chat_message({
         "role": "assistant",
         "content": resolution_message,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "timestamp": now_str
     })
     
-    # Update ticket in TinyDB as resolved
+    # Update ticket in the ticket store as resolved
     if "ticket_id" in st.session_state and st.session_state.ticket_id:
         # Get the solution that was provided
         solution = ""
         if st.session_state.issue_summary and 'solution' in st.session_state.issue_summary:
             solution = st.session_state.issue_summary['solution']
         
-        # Mark ticket as resolved in TinyDB
+        # Mark ticket as resolved in the ticket store
         st.session_state.ticket_system.mark_as_resolved(
             st.session_state.ticket_id,
-            solution
+            solution,
+            ts=now_str
         )
         
-        # Add final resolution message to TinyDB
+        # Add final resolution message to the ticket store
         st.session_state.ticket_system.update_conversation(
             st.session_state.ticket_id,
             resolution_message,
-            "assistant"
+            "assistant",
+            ts=now_str
         )
 
 def request_human_agent():
@@ -248,15 +307,7 @@ def request_human_agent():
     st.session_state.ticket_system.flag_for_human_agent(st.session_state.ticket_id)
     
     # Calculate estimated resolution time
-    if st.session_state.assignment_result:
-        if st.session_state.assignment_result["source"] == "historical_data":
-            est_hours = st.session_state.assignment_result['estimated_resolution_hours']
-        else:
-            est_hours = st.session_state.assignment_result.get('estimated_resolution_hours', 24)
-    else:
-        est_hours = 24  # default
-    
-    formatted_time = format_time(est_hours)
+    _, formatted_time = get_resolution_estimate()
     
     # Add ticket created message to chat history
     ticket_message = (
@@ -264,17 +315,19 @@ def request_human_agent():
         f"A human agent from our {st.session_state.assignment_result.get('assigned_team', 'support')} team "
         f"will contact you shortly. The estimated resolution time is {formatted_time}. Thank you for your patience."
     )
-    st.session_state.chat_history.append({
+    now_str = timestamp_now()
+    append_chat_message({
         "role": "assistant",
         "content": ticket_message,
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "timestamp": now_str
     })
     
-    # Add message to TinyDB conversation
+    # Add message to the ticket conversation
     st.session_state.ticket_system.update_conversation(
         st.session_state.ticket_id,
         ticket_message,
-        "assistant"
+        "assistant",
+        ts=now_str
     )
 
 def extract_common_solutions():
@@ -282,56 +335,49 @@ def extract_common_solutions():
     if not st.session_state.similar_issues:
         return
     
-    # Extract solutions from similar issues
-    common_solutions = []
-    for issue in st.session_state.similar_issues:
-        if issue['similarity_score'] >= 0.3:  # Only use reasonably similar issues
-            solution = {
-                "issue": issue['issue'],
-                "solution": issue['metadata']['solution'],
-                "similarity": issue['similarity_score']
-            }
-            common_solutions.append(solution)
-    
-    # Sort by similarity score and take top 3
-    common_solutions.sort(key=lambda x: x['similarity'], reverse=True)
-    st.session_state.common_solutions = common_solutions[:3]
+    # Take the top 3 reasonably similar issues by similarity score (the cutoff follows the
+    # collection's score scale)
+    min_score = get_assign_agent().good_match_score
+    top_issues = heapq.nlargest(
+        3,
+        (issue for issue in st.session_state.similar_issues if issue['similarity_score'] >= min_score),
+        key=lambda x: x['similarity_score']
+    )
+    
+    # Extract solutions only for the issues that made the cut
+    st.session_state.common_solutions = [
+        {
+            "issue": issue['issue'],
+            "solution": issue['metadata']['solution'],
+            "similarity": issue['similarity_score']
+        }
+        for issue in top_issues
+    ]
 
 # Helper function to get recent messages for context
 def get_recent_context(num_messages=3):
     """Get the most recent messages from chat history for context"""
-    messages = []
-    
-    # Get only user and assistant messages (not system)
-    user_assistant_msgs = [msg for msg in st.session_state.chat_history 
-                         if msg["role"] in ["user", "assistant"]]
-    
-    # Take up to the last num_messages
-    recent = user_assistant_msgs[-num_messages:] if len(user_assistant_msgs) > num_messages else user_assistant_msgs
+    # Walk the user/assistant view backwards so only the last num_messages are touched
+    recent = list(islice(reversed(st.session_state.ua_messages), num_messages))
+    recent.reverse()
     
-    for msg in recent:
-        messages.append({"role": msg["role"], "content": msg["content"]})
-    
-    return messages
+    return [{"role": msg["role"], "content": msg["content"]} for msg in recent]
 
 # Helper function to get full conversation history
 def get_full_context():
     """Get the full conversation history for better context understanding"""
-    messages = []
-    
-    # Get only user and assistant messages (not system)
-    user_assistant_msgs = [msg for msg in st.session_state.chat_history 
-                         if msg["role"] in ["user", "assistant"]]
-    
-    for msg in user_assistant_msgs:
-        messages.append({"role": msg["role"], "content": msg["content"]})
-    
-    return messages
+    return [{"role": msg["role"], "content": msg["content"]} for msg in st.session_state.ua_messages]
 
 # Initialize session state variables
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
+# User/assistant messages only (no system), maintained by append_chat_message
+if "ua_messages" not in st.session_state:
+    st.session_state.ua_messages = deque(
+        msg for msg in st.session_state.chat_history if msg["role"] in ("user", "assistant")
+    )
+
 if "issue_summary" not in st.session_state:
     st.session_state.issue_summary = None
 
@@ -362,48 +408,9 @@ if "human_agent_requested" not in st.session_state:
 if "ticket_id" not in st.session_state:
     st.session_state.ticket_id = None
 
-# Initialize agents
-if "openai_client" not in st.session_state:
-    st.session_state.openai_client = OpenAIClient()
-
-if "chroma_agent" not in st.session_state:
-    st.session_state.chroma_agent = ChromaAgent()
-
-if "summarization_agent" not in st.session_state:
-    st.session_state.summarization_agent = SummarizationAgent(
-        st.session_state.openai_client
-    )
-
-if "assign_agent" not in st.session_state:
-    st.session_state.assign_agent = AssignAgent(
-        st.session_state.openai_client,
-        st.session_state.chroma_agent,
-        st.session_state.summarization_agent
-    )
-
-# Initialize the ticket system
+# Initialize the ticket system (one store per process, shared by all sessions)
 if "ticket_system" not in st.session_state:
-    st.session_state.ticket_system = DynamicTicketing()
-
-# Preload historical data if needed
-if "data_loaded" not in st.session_state:
-    try:
-        # Check if we need to load data
-        count = st.session_state.chroma_agent.collection.count()
-        if count == 0:
-            print("No data in ChromaDB, loading historical data...")
-            # Try to load data from the expected location
-            csv_path = "app/chat_history/historical_ticket_new.csv"
-            if os.path.exists(csv_path):
-                records = st.session_state.chroma_agent.load_data_from_csv(csv_path)
-                print(f"Loaded {records} records into ChromaDB")
-            else:
-                print(f"Warning: Historical data file not found at {csv_path}")
-        else:
-            print(f"ChromaDB already contains {count} documents")
-    except Exception as e:
-        print(f"Error preloading data: {str(e)}")
-    st.session_state.data_loaded = True
+    st.session_state.ticket_system = get_ticket_system()
 
 # Main layout with two columns
 col1, col2 = st.columns([1, 2])
@@ -452,15 +459,7 @@ with col2:
     # Show ticket information if human agent was requested
     if st.session_state.human_agent_requested and st.session_state.ticket_id:
         # Calculate estimated resolution time
-        if st.session_state.assignment_result:
-            if st.session_state.assignment_result["source"] == "historical_data":
-                est_hours = st.session_state.assignment_result['estimated_resolution_hours']
-            else:
-                est_hours = st.session_state.assignment_result.get('estimated_resolution_hours', 24)
-        else:
-            est_hours = 24  # default
-            
-        formatted_time = format_time(est_hours)
+        _, formatted_time = get_resolution_estimate()
         st.success(f"Ticket #{st.session_state.ticket_id} has been created. A support agent will contact you within {formatted_time}.")
     
     # Chat input at the bottom
@@ -484,15 +483,13 @@ with st.sidebar:
         
         if st.session_state.assignment_result:
             if st.session_state.assignment_result["source"] == "historical_data":
-                est_hours = st.session_state.assignment_result['estimated_resolution_hours']
-                formatted_time = format_time(est_hours)
+                _, formatted_time = get_resolution_estimate()
                 st.write(f"**Team**: {st.session_state.assignment_result['assigned_team']}")
                 st.write(f"**Est. Resolution**: {formatted_time}")
                 st.write(f"**Confidence**: {st.session_state.assignment_result['confidence_score']:.2f}")
                 st.write(f"**Source**: Based on historical similar cases")
             elif "assigned_team" in st.session_state.assignment_result:
-                est_hours = st.session_state.assignment_result.get('estimated_resolution_hours', 24)
-                formatted_time = format_time(est_hours)
+                _, formatted_time = get_resolution_estimate()
                 st.write(f"**Team**: {st.session_state.assignment_result['assigned_team']}")
                 st.write(f"**Est. Resolution**: {formatted_time}")
                 st.write(f"**Source**: AI recommendation")
@@ -1,27 +1,299 @@
 import pandas as pd
+import numpy as np
 import json
 import re
+import math
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson is optional; its JSONDecodeError subclasses json.JSONDecodeError, so handlers work either way
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 from get_response import OpenAIClient
 from chroma_agent import ChromaAgent
 from summarization_agent import SummarizationAgent
-from prompts import assignment_agent_prompt
+from prompts import assignment_agent_prompt, combined_agent_prompt
+
+SEMANTIC_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_namespace ON cache(namespace, created_at);
+"""
+
+logger = logging.getLogger(__name__)
+
+# Prompt templates are immutable, so every agent instance shares one copy
+ASSIGNMENT_PROMPT = assignment_agent_prompt()
+COMBINED_PROMPT = combined_agent_prompt()
+
+# Semantic cache entries are namespaced by the prompt texts so editing a prompt invalidates them
+CACHE_NAMESPACE = hashlib.sha256("".join((
+    ASSIGNMENT_PROMPT.system_prompt, ASSIGNMENT_PROMPT.user_prompt,
+    COMBINED_PROMPT.system_prompt, COMBINED_PROMPT.user_prompt
+)).encode()).hexdigest()[:16]
+
+# Default similarity cutoffs, tuned on the l2 space's exp(-squared L2) scores
+GOOD_MATCH_SCORE = 0.3
+REFINE_BELOW_SCORE = 0.5
+
+def l2_score_to_cosine(score):
+    """Cosine similarity that an exp(-squared L2) score between unit vectors corresponds to"""
+    # Squared L2 between unit vectors is 2 - 2 * cos, so exp(-(2 - 2 * cos)) = score
+    return 1 + math.log(score) / 2
+
+# Patterns for pulling a JSON object out of free-form LLM output
+JSON_FENCE_RE = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL)
+JSON_OBJECT_RE = re.compile(r'\{(?:[^{}]|"[^"]*")*\}', re.DOTALL)
 
 class AssignAgent:
-    def __init__(self, openai_client=None, chroma_agent=None, summarization_agent=None):
+    def __init__(self, openai_client=None, chroma_agent=None, summarization_agent=None,
+                 cache_path=None, cache_max_distance=0.1, cache_ttl_seconds=24 * 3600,
+                 refine_below_score=None, cache_max_entries=1000, good_match_score=None):
         """
         Initialize the assignment agent.
         
         Args:
             openai_client (OpenAIClient, optional): Client for OpenAI API
-            chroma_agent (ChromaAgent, optional): Agent for ChromaDB operations
+            chroma_agent (ChromaAgent, optional): Agent for ChromaDB operations. Long-running
+                apps should build one at startup and pass it in; the default shares the
+                process-wide model and client but still opens the collection and caches
             summarization_agent (SummarizationAgent, optional): Agent for summarizing issues
+            cache_path (str, optional): SQLite file for the semantic result cache
+                (defaults to assign_cache.sqlite3 in the ChromaDB directory)
+            cache_max_distance (float): Largest cosine distance between query embeddings
+                that still counts as a cache hit
+            cache_ttl_seconds (float): How long a cached assignment stays valid
+            cache_max_entries (int): Most entries kept in the semantic cache; the oldest are
+                evicted first
+            refine_below_score (float, optional): When summarizing here, raw-text matches whose
+                best similarity score is below this are replaced by a search on the summary
+            good_match_score (float, optional): Smallest similarity score of a historical match
+                that lets historical data decide the assignment instead of the LLM
+            
+        Both cutoffs default to REFINE_BELOW_SCORE and GOOD_MATCH_SCORE in the collection's
+        score scale: as is for l2 collections, converted to cosine for ip and cosine ones.
         """
         self.openai_client = openai_client if openai_client else OpenAIClient()
         self.chroma_agent = chroma_agent if chroma_agent else ChromaAgent()
         self.summarization_agent = summarization_agent if summarization_agent else SummarizationAgent(self.openai_client)
-        self.prompt_template = assignment_agent_prompt()
+        self.prompt_template = ASSIGNMENT_PROMPT
+        self.combined_prompt_template = COMBINED_PROMPT
+        
+        # Similarity scores are exp(-squared L2) in l2 collections and raw cosine otherwise
+        if getattr(self.chroma_agent, "space", "l2") == "l2":
+            default_refine, default_good = REFINE_BELOW_SCORE, GOOD_MATCH_SCORE
+        else:
+            default_refine, default_good = l2_score_to_cosine(REFINE_BELOW_SCORE), l2_score_to_cosine(GOOD_MATCH_SCORE)
+        self.refine_below_score = refine_below_score if refine_below_score is not None else default_refine
+        self.good_match_score = good_match_score if good_match_score is not None else default_good
+        
+        # Semantic cache of assignment results keyed by query embedding, within a namespace per
+        # prompt version and request context (chat history, result counts, supplied summary)
+        self.cache_max_distance = cache_max_distance
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_max_entries = cache_max_entries
+        self._cache_namespace = CACHE_NAMESPACE
+        self._cache_lock = threading.Lock()
+        self._sem_cache = sqlite3.connect(
+            cache_path or os.path.join(self.chroma_agent.db_dir, "assign_cache.sqlite3"),
+            check_same_thread=False
+        )
+        self._sem_cache.executescript(SEMANTIC_CACHE_SCHEMA)
+    
+    def _cache_context(self, chat_history, n_results, n_similar, summary_result):
+        """
+        Cache namespace for one set of request parameters.
+        
+        Args:
+            chat_history (list, optional): Previous conversation history
+            n_results (int): Number of similar results to consider
+            n_similar (int, optional): Number of matches returned as "search_results"
+            summary_result (dict, optional): Summary supplied by the caller
+            
+        Returns:
+            str: Prompt namespace plus a hash of everything besides the query that shapes the result
+        """
+        context = json.dumps([
+            chat_history or [], n_results, n_similar or n_results,
+            summary_result["summary"] if summary_result else None
+        ], sort_keys=True, default=str)
+        return f"{self._cache_namespace}:{hashlib.sha256(context.encode()).hexdigest()[:16]}"
+    
+    def _cache_lookup(self, query_embedding, namespace):
+        """
+        Find a cached result for a query embedding.
+        
+        Args:
+            query_embedding (np.ndarray): L2-normalized query embedding
+            namespace (str): Cache namespace from _cache_context
+            
+        Returns:
+            dict: Cached result within cache_max_distance, or None
+        """
+        with self._cache_lock:
+            rows = self._sem_cache.execute(
+                "SELECT embedding, payload FROM cache WHERE namespace = ? AND created_at >= ? ORDER BY id DESC LIMIT ?",
+                (namespace, time.time() - self.cache_ttl_seconds, self.cache_max_entries)
+            ).fetchall()
+        if not rows:
+            return None
         
-    def process_and_assign(self, query_text, chat_history=None, n_results=3):
+        # Stored embeddings are normalized, so cosine distance is 1 - dot product
+        embeddings = np.stack([np.frombuffer(row[0], dtype=np.float32) for row in rows])
+        distances = 1.0 - embeddings @ query_embedding
+        best = int(np.argmin(distances))
+        if distances[best] >= self.cache_max_distance:
+            return None
+        return json.loads(rows[best][1])
+    
+    def _cache_store(self, query_embedding, result, namespace):
+        """
+        Store a result in the semantic cache and drop expired and overflowing entries.
+        
+        Args:
+            query_embedding (np.ndarray): L2-normalized query embedding
+            result (dict): Assignment result to cache
+            namespace (str): Cache namespace from _cache_context
+            
+        Returns:
+            int: Row id of the cache entry
+        """
+        now = time.time()
+        with self._cache_lock, self._sem_cache:
+            self._sem_cache.execute("DELETE FROM cache WHERE created_at < ?", (now - self.cache_ttl_seconds,))
+            cache_id = self._sem_cache.execute(
+                "INSERT INTO cache (namespace, embedding, payload, created_at) VALUES (?, ?, ?, ?)",
+                (namespace, query_embedding.astype(np.float32).tobytes(), json.dumps(result), now)
+            ).lastrowid
+            # Keep only the newest cache_max_entries rows
+            self._sem_cache.execute(
+                "DELETE FROM cache WHERE id <= ?", (cache_id - self.cache_max_entries,)
+            )
+            return cache_id
+    
+    def _cacheable(self, result):
+        """
+        Check whether an assignment result is fit for the semantic cache.
+        
+        Args:
+            result (dict): Assignment result
+            
+        Returns:
+            bool: False if the assignment or the summary failed
+        """
+        if result.get("parsing_failed") or not result.get("assigned_team"):
+            return False
+        # SummarizationAgent reports failures in the summary text; None means it is still pending
+        summary = result.get("summary")
+        return summary is None or not (summary == "Error parsing summary" or summary.startswith("Error:"))
+    
+    def _bg_summarize_and_store(self, query_text, result, cache_id=None):
+        """
+        Summarize an issue off the request path and record the summary on its result.
+        
+        Args:
+            query_text (str): The query text describing the issue
+            result (dict): Assignment result returned without a summary; updated in place
+            cache_id (int, optional): Semantic cache row holding the same result
+        """
+        summary_result = self.summarization_agent.summarize_issue(query_text)
+        for field in ("summary", "sentiment", "priority", "solution"):
+            result[field] = summary_result.get(field)
+        print(f"Background summary for '{query_text}': '{result['summary']}'")
+        
+        if cache_id is not None and not self._cacheable(result):
+            # A failed summary must not be served from the cache; drop the entry instead
+            with self._cache_lock, self._sem_cache:
+                self._sem_cache.execute("DELETE FROM cache WHERE id = ?", (cache_id,))
+        elif cache_id is not None:
+            with self._cache_lock, self._sem_cache:
+                self._sem_cache.execute(
+                    "UPDATE cache SET payload = ? WHERE id = ?", (json.dumps(result), cache_id)
+                )
+    
+    def process_and_assign(self, query_text, chat_history=None, n_results=3, summary_result=None,
+                           defer_summary=False, n_similar=None):
+        """
+        Assign a team and estimate resolution time, reusing the result of a near-duplicate
+        earlier query when one is in the semantic cache.
+        
+        Args:
+            query_text (str): The query text describing the issue
+            chat_history (list, optional): Previous conversation history
+            n_results (int): Number of similar results to consider
+            summary_result (dict, optional): Existing summarize_issue result for query_text,
+                reused instead of summarizing again
+            defer_summary (bool): Without summary_result, search on the raw text and summarize
+                in a background thread instead of blocking on the LLM. The returned dict's
+                "summary" is None until that thread fills it in
+            n_similar (int, optional): Number of matches returned as "search_results" for
+                display (defaults to n_results). One search fetches the larger of the two;
+                assignment uses the top n_results
+            
+        Returns:
+            dict: Contains assigned team, estimated resolution time, the issue's summary,
+                sentiment, priority and suggested solution, and other info
+        """
+        # embed_query returns unit-length vectors, so no renormalization is needed here
+        query_embedding = self.chroma_agent.embed_query(query_text)
+        namespace = self._cache_context(chat_history, n_results, n_similar, summary_result)
+        cached = self._cache_lookup(query_embedding, namespace)
+        if cached is not None:
+            logger.info("Semantic cache hit for: '%s'", query_text)
+            cached["query_text"] = query_text
+            cached["cache_hit"] = True
+            return cached
+        
+        deferred = defer_summary and summary_result is None
+        result = self._assign(query_text, chat_history, n_results, summary_result, deferred, n_similar)
+        
+        # Don't cache failures; they should be retried
+        cache_id = None
+        if self._cacheable(result):
+            cache_id = self._cache_store(query_embedding, result, namespace)
+        
+        if deferred:
+            threading.Thread(
+                target=self._bg_summarize_and_store, args=(query_text, result, cache_id), daemon=True
+            ).start()
+        return result
+    
+    def process_batch(self, queries, chat_histories=None, n_results=3, max_concurrency=10):
+        """
+        Assign many issues concurrently, e.g. for backfills and evaluation runs.
+        
+        Args:
+            queries (list): Query texts describing the issues
+            chat_histories (list, optional): One chat history (or None) per query
+            n_results (int): Number of similar results to consider per query
+            max_concurrency (int): Maximum number of issues processed at once
+            
+        Returns:
+            list: Assignment results, in the same order as queries
+        """
+        if chat_histories is None:
+            chat_histories = [None] * len(queries)
+        
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(
+                lambda args: self.process_and_assign(args[0], chat_history=args[1], n_results=n_results),
+                zip(queries, chat_histories)
+            ))
+    
+    def _assign(self, query_text, chat_history=None, n_results=3, summary_result=None, defer_summary=False,
+                n_similar=None):
         """
         Process an issue, find similar historical issues, assign a team, and estimate resolution time.
         If no similar issues found, use LLM for team assignment.
@@ -30,55 +302,85 @@ class AssignAgent:
             query_text (str): The query text describing the issue
             chat_history (list, optional): Previous conversation history
             n_results (int): Number of similar results to consider
+            summary_result (dict, optional): Existing summarize_issue result for query_text,
+                reused instead of summarizing again
+            defer_summary (bool): Search on the raw text and leave "summary" as None
+            n_similar (int, optional): Number of matches returned as "search_results"
             
         Returns:
             dict: Contains assigned team, estimated resolution time, and other info
         """
+        # LLM team assignment made alongside the summary, if any
+        llm_assignment = None
+        
+        # A single search serves both the assignment and the caller's display
+        n_similar = n_similar or n_results
+        n_search = max(n_results, n_similar)
+        
         # First, summarize the issue to get a better query for ChromaDB
-        print(f"Getting summary for issue: '{query_text}'")
-        summary_result = self.summarization_agent.summarize_issue(query_text)
+        if summary_result is None and defer_summary:
+            # MiniLM copes well with the raw text; the summary is filled in by the caller later
+            print(f"Deferring summary, searching on raw text: '{query_text}'")
+            similar_issues = self.chroma_agent.query(query_text, n_search)
+            summary_result = {"summary": None}
+            needs_refine = False
+        elif summary_result is None:
+            # Overlap a single summarize-and-triage LLM call with a preliminary search on the raw text
+            print(f"Getting summary and triage for issue: '{query_text}'")
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                triage_future = executor.submit(self._summarize_and_triage, query_text, chat_history)
+                prelim_future = executor.submit(self.chroma_agent.query, query_text, n_search)
+                summary_result, llm_assignment = triage_future.result()
+                similar_issues = prelim_future.result()
+            
+            # Keep the raw-text matches if they are strong, otherwise refine with the summary
+            top_score = max((issue['similarity_score'] for issue in similar_issues), default=0)
+            needs_refine = top_score < self.refine_below_score
+        else:
+            needs_refine = True
         
-        # Use the summary for querying similar issues
-        search_query = summary_result["summary"]
-        print(f"Using summary for search: '{search_query}'")
+        if needs_refine:
+            # Use the summary for querying similar issues
+            search_query = summary_result["summary"]
+            print(f"Using summary for search: '{search_query}'")
+            
+            # Get similar issues from ChromaDB
+            similar_issues = self.chroma_agent.query(search_query, n_search)
         
-        # Get similar issues from ChromaDB
-        similar_issues = self.chroma_agent.query(search_query, n_results)
+        # Keep the display matches; only the top n_results take part in the assignment
+        search_results = similar_issues[:n_similar]
+        similar_issues = similar_issues[:n_results]
         
-        # Debug - print all similar issues and their similarity scores
-        print(f"Found {len(similar_issues)} similar issues")
-        for i, issue in enumerate(similar_issues):
-            print(f"Issue #{i+1}: '{issue['issue']}' - Score: {issue['similarity_score']}")
+        # Debug - log all similar issues and their similarity scores
+        logger.debug("Found %d similar issues", len(similar_issues))
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, issue in enumerate(similar_issues):
+                logger.debug("Issue #%d: '%s' - Score: %s", i + 1, issue['issue'], issue['similarity_score'])
         
-        # Check if we have any good matches (similarity score >= 0.3)
-        has_good_matches = any(result['similarity_score'] >= 0.3 for result in similar_issues)
-        print(f"Has good matches with score >= 0.3: {has_good_matches}")
+        # Check if we have any good matches (similarity score >= good_match_score)
+        has_good_matches = any(result['similarity_score'] >= self.good_match_score for result in similar_issues)
+        print(f"Has good matches with score >= {self.good_match_score:.2f}: {has_good_matches}")
         
         if not similar_issues or not has_good_matches:  # If no good matches found
-            print("No similar cases found with sufficient similarity. Sending to LLM for assignment...")
-            
-            # Format previous conversation for context if available
-            previous_context = ""
-            if chat_history and len(chat_history) > 0:
-                previous_context = "Previous conversation:\n"
-                for msg in chat_history:
-                    role = msg["role"]
-                    content = msg["content"]
-                    previous_context += f"{role}: {content}\n"
-                previous_context += "\n"
-            
-            # Format the prompt using the template
-            user_prompt = self.prompt_template.user_prompt.format(
-                previous_context=previous_context,
-                query_text=query_text
-            )
-            system_prompt = self.prompt_template.system_prompt
-            
-            # Get response from LLM
-            llm_response = self.openai_client.get_response(user_prompt, system_prompt, chat_history)
-            
-            # Parse the JSON from the LLM response
-            parsed_data = self._parse_llm_response(llm_response)
+            if llm_assignment is not None:
+                # The combined triage call already assigned a team; no second round-trip needed
+                print("No similar cases found with sufficient similarity. Using the LLM triage assignment...")
+                parsed_data, llm_response = llm_assignment
+            else:
+                print("No similar cases found with sufficient similarity. Sending to LLM for assignment...")
+                
+                # Format the prompt using the template
+                user_prompt = self.prompt_template.user_prompt.format(
+                    previous_context=self._format_previous_context(chat_history),
+                    query_text=query_text
+                )
+                system_prompt = self.prompt_template.system_prompt
+                
+                # Get response from LLM
+                llm_response = self.openai_client.get_response(user_prompt, system_prompt, chat_history)
+                
+                # Parse the JSON from the LLM response
+                parsed_data = self._parse_llm_response(llm_response)
             
             if parsed_data:
                 return {
@@ -89,6 +391,10 @@ class AssignAgent:
                     "similar_cases_found": False,
                     "query_text": query_text,
                     "summary": summary_result["summary"],
+                    "sentiment": summary_result.get("sentiment"),
+                    "priority": summary_result.get("priority"),
+                    "solution": summary_result.get("solution"),
+                    "search_results": search_results,
                     "raw_response": llm_response
                 }
             else:
@@ -99,40 +405,53 @@ class AssignAgent:
                     "similar_cases_found": False,
                     "query_text": query_text,
                     "summary": summary_result["summary"],
+                    "sentiment": summary_result.get("sentiment"),
+                    "priority": summary_result.get("priority"),
+                    "solution": summary_result.get("solution"),
+                    "search_results": search_results,
                     "parsing_failed": True
                 }
         
         print("Using historical data for assignment")
-        # Process similar issues found
-        team_votes = {}
-        resolution_times = []
-        
-        for issue in similar_issues:
-            team = issue['metadata']['assigned_team']
-            team_votes[team] = team_votes.get(team, 0) + issue['similarity_score']
-            
-            # Calculate resolution time in hours for this issue
-            try:
-                open_time = pd.to_datetime(issue['metadata']['ticket_open_date'])
-                resolve_time = pd.to_datetime(issue['metadata']['resolution_date'])
-                resolution_hours = (resolve_time - open_time).total_seconds() / 3600
-                resolution_times.append((resolution_hours, issue['similarity_score']))
-            except Exception as e:
-                print(f"Error calculating resolution time: {str(e)}")
-                # If there's an error, use a default resolution time
-                resolution_times.append((24, issue['similarity_score']))  # 24 hours as fallback
-        
-        # Assign team based on weighted voting
-        assigned_team = max(team_votes.items(), key=lambda x: x[1])[0]
-        print(f"Team votes: {team_votes}")
+        # Process similar issues found as arrays: one similarity score, team and date pair per issue
+        scores = np.fromiter((issue['similarity_score'] for issue in similar_issues), dtype=np.float64)
+        teams = [issue['metadata']['assigned_team'] for issue in similar_issues]
+        
+        # Resolution time is precomputed at ingest; documents loaded before that have NaN here
+        resolution_hours = np.fromiter(
+            (issue['metadata'].get('resolution_hours', np.nan) for issue in similar_issues), dtype=np.float64
+        )
+        missing = np.isnan(resolution_hours)
+        if missing.any():
+            # Parse the dates of those issues in one call each (format='mixed' parses each value
+            # on its own); unparseable dates become NaT
+            older = [issue['metadata'] for issue, is_missing in zip(similar_issues, missing) if is_missing]
+            open_times = pd.to_datetime(
+                [metadata.get('ticket_open_date') for metadata in older], errors='coerce', format='mixed', cache=True
+            )
+            resolve_times = pd.to_datetime(
+                [metadata.get('resolution_date') for metadata in older], errors='coerce', format='mixed', cache=True
+            )
+            resolution_hours[missing] = (resolve_times - open_times).total_seconds().to_numpy() / 3600
+            if np.isnan(resolution_hours).any():
+                print("Error calculating resolution time: unparseable dates, using 24 hours for those issues")
+                resolution_hours = np.nan_to_num(resolution_hours, nan=24.0)  # 24 hours as fallback
+        
+        # Similarity scores can be negative in ip/cosine space; those issues get no weight (at
+        # least one good match is positive, so the weights never sum to zero)
+        weights = np.clip(scores, 0, None)
+        
+        # Assign team based on weighted voting (ties go to the team seen first)
+        team_votes = pd.Series(weights).groupby(teams, sort=False).sum()
+        assigned_team = team_votes.idxmax()
+        print(f"Team votes: {team_votes.to_dict()}")
         print(f"Assigned team: {assigned_team}")
         
         # Calculate estimated resolution time (weighted average based on similarity scores)
-        total_weight = sum(score for _, score in resolution_times)
-        estimated_hours = sum(hours * score for hours, score in resolution_times) / total_weight
+        estimated_hours = float(np.dot(resolution_hours, weights) / weights.sum())
         
         # Calculate confidence score
-        confidence_score = max(team_votes.values()) / sum(team_votes.values())
+        confidence_score = float(team_votes.max() / team_votes.sum())
         
         return {
             "source": "historical_data",
@@ -142,9 +461,68 @@ class AssignAgent:
             "similar_cases": len(similar_issues),
             "similar_issues": similar_issues,
             "query_text": query_text,
-            "summary": summary_result["summary"]
+            "summary": summary_result["summary"],
+            "sentiment": summary_result.get("sentiment"),
+            "priority": summary_result.get("priority"),
+            "solution": summary_result.get("solution"),
+            "search_results": search_results
         }
     
+    def _format_previous_context(self, chat_history):
+        """
+        Format previous conversation for prompt context.
+        
+        Args:
+            chat_history (list, optional): Previous conversation history
+            
+        Returns:
+            str: "Previous conversation:" block, or an empty string without history
+        """
+        if not chat_history:
+            return ""
+        
+        # Build the lines in a list and join once instead of growing a string with +=
+        parts = ["Previous conversation:"]
+        parts.extend(f"{msg['role']}: {msg['content']}" for msg in chat_history)
+        parts.append("")
+        return "\n".join(parts) + "\n"
+    
+    def _summarize_and_triage(self, query_text, chat_history=None):
+        """
+        Summarize an issue and assign it a team with one LLM call.
+        
+        Args:
+            query_text (str): The query text describing the issue
+            chat_history (list, optional): Previous conversation history
+            
+        Returns:
+            tuple: (summary_result shaped like SummarizationAgent.summarize_issue output,
+                (parsed assignment, raw response) or None if the reply had no usable team)
+        """
+        user_prompt = self.combined_prompt_template.user_prompt.format(
+            previous_context=self._format_previous_context(chat_history),
+            query_text=query_text
+        )
+        llm_response = self.openai_client.get_response(
+            user_prompt, self.combined_prompt_template.system_prompt, chat_history
+        )
+        parsed_data = self._parse_llm_response(llm_response)
+        
+        # Fall back to the dedicated summarizer if the combined reply is unusable
+        if not parsed_data or not parsed_data.get("summary"):
+            print("Combined triage response unusable, falling back to summarization agent")
+            return self.summarization_agent.summarize_issue(query_text), None
+        
+        summary_result = {
+            "summary": parsed_data.get("summary", ""),
+            "sentiment": parsed_data.get("sentiment", ""),
+            "priority": parsed_data.get("priority", ""),
+            "solution": parsed_data.get("solution", ""),
+            "raw_response": llm_response
+        }
+        llm_assignment = (parsed_data, llm_response) if parsed_data.get("assigned_team") else None
+        return summary_result, llm_assignment
+    
     def _parse_llm_response(self, response):
         """
         Parse the JSON response from the LLM.
@@ -155,18 +533,26 @@ class AssignAgent:
         Returns:
             dict: Parsed JSON data or None if parsing fails
         """
+        # Fast path: the whole response is already a JSON object
+        try:
+            parsed = json_loads(response.strip())
+            if isinstance(parsed, dict):
+                return parsed
+        except json.JSONDecodeError:
+            pass
+        
         try:
             # Try to find JSON in the response using regex
-            json_match = re.search(r'```json\s*(\{.*?\})\s*', response, re.DOTALL)
+            json_match = JSON_FENCE_RE.search(response)
             if json_match:
                 json_str = json_match.group(1)
-                return json.loads(json_str)
+                return json_loads(json_str)
             
             # If no match with ```json format, try to find any JSON object
-            json_match = re.search(r'\{(?:[^{}]|"[^"]*")*\}', response, re.DOTALL)
+            json_match = JSON_OBJECT_RE.search(response)
             if json_match:
                 json_str = json_match.group(0)
-                return json.loads(json_str)
+                return json_loads(json_str)
             
             # If no JSON object found, return None
             print("No JSON format found in LLM response")
@@ -1,25 +1,98 @@
 import chromadb
+from chromadb.config import Settings
+import torch
 from sentence_transformers import SentenceTransformer
 import numpy as np
 import os
+import hashlib
+import sqlite3
+import threading
+import time
+import logging
+import functools
 import pandas as pd
 
+# FAISS is optional; without it the flat index is searched with a NumPy matrix product
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# HNSW settings for newly created collections: embeddings are unit length, so inner product
+# is exact cosine similarity; tuned for recall on small top-k
+COLLECTION_METADATA = {
+    "hnsw:space": "ip",
+    "hnsw:construction_ef": 200,
+    "hnsw:M": 32,
+    "hnsw:search_ef": 64
+}
+
+# Process-wide embedders and Chroma clients, so every ChromaAgent in the process shares one
+# loaded model per device and one client per database directory
+_MODEL_CACHE = {}
+_CLIENT_CACHE = {}
+_SHARED_LOCK = threading.Lock()
+
+# Collections at least this large get an int8 scalar-quantized FAISS index (a quarter of the
+# memory traffic per scan) with exact re-ranking of the top candidates
+QUANTIZE_MIN_DOCUMENTS = 10_000
+QUANTIZE_TRAIN_SAMPLE = 10_000
+QUANTIZE_REFINE_FACTOR = 4
+
+# Minimum seconds between checks of the collection's document count for writes made elsewhere
+FLAT_INDEX_RECHECK_SECONDS = 5.0
+
 class ChromaAgent:
-    def __init__(self, db_dir="new_support_issues", collection_name="new_support_issues"):
+    def __init__(self, db_dir="new_support_issues", collection_name="new_support_issues", device=None):
         """
         Initialize the ChromaDB agent.
         
         Args:
             db_dir (str): Directory path for ChromaDB
             collection_name (str): Name of the ChromaDB collection
+            device (str, optional): Torch device for the embedder, e.g. "cuda" or "cpu".
+                Defaults to the EMBEDDING_DEVICE environment variable, then CUDA when available
         """
         # Create the directory if it doesn't exist
         os.makedirs(db_dir, exist_ok=True)
             
         self.db_dir = db_dir
         self.collection_name = collection_name
-        self.client = chromadb.PersistentClient(path=db_dir)
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+        device = device or os.environ.get("EMBEDDING_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu")
+        
+        # Reuse the process-wide client and embedding model, creating them on first use
+        with _SHARED_LOCK:
+            client_key = os.path.abspath(db_dir)
+            if client_key not in _CLIENT_CACHE:
+                _CLIENT_CACHE[client_key] = chromadb.PersistentClient(
+                    path=db_dir, settings=Settings(anonymized_telemetry=False)
+                )
+            self.client = _CLIENT_CACHE[client_key]
+            
+            model_key = (EMBEDDING_MODEL, device)
+            if model_key not in _MODEL_CACHE:
+                _MODEL_CACHE[model_key] = SentenceTransformer(EMBEDDING_MODEL, device=device)
+                print(f"Embedding model '{EMBEDDING_MODEL}' running on {device}")
+            self.embedder = _MODEL_CACHE[model_key]
+        
+        # Persistent embedding cache keyed by a hash of the model name and text, so unchanged
+        # texts are never re-encoded across reloads and restarts
+        self._emb_cache_lock = threading.Lock()
+        self._emb_cache = sqlite3.connect(os.path.join(db_dir, "emb_cache.sqlite3"), check_same_thread=False)
+        self._emb_cache.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        
+        # Query embeddings are also memoized in memory so repeated searches skip the cache lookup
+        self.embed_query = functools.lru_cache(maxsize=1024)(self._embed_query)
+        
+        # In-memory flat inner-product index over the collection, built on first query and
+        # rebuilt when the collection's document count changes
+        self._flat_lock = threading.Lock()
+        self._flat_index = None
+        self._flat_checked_at = 0.0
         
         # Get or create collection
         collections = [c.name for c in self.client.list_collections()]
@@ -33,15 +106,181 @@ class ChromaAgent:
             except Exception as e:
                 print(f"Error getting collection count: {str(e)}")
         else:
-            self.collection = self.client.create_collection(name=collection_name)
+            self.collection = self.client.create_collection(name=collection_name, metadata=COLLECTION_METADATA)
             print(f"Created new collection '{collection_name}'")
+        
+        # Existing collections keep the space they were created with (Chroma's default is l2)
+        self.space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+            
+    def _cached_vectors(self, keys):
+        """
+        Fetch vectors from the embedding cache.
+        
+        Args:
+            keys (list): Cache keys to look up
+            
+        Returns:
+            dict: Cache key to float32 vector, for the keys that were found
+        """
+        # Look up in chunks to stay under SQLite's parameter limit
+        vectors = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._emb_cache_lock:
+            for i in range(0, len(unique_keys), 500):
+                chunk = unique_keys[i:i + 500]
+                rows = self._emb_cache.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                )
+                for key, blob in rows:
+                    vectors[key] = np.frombuffer(blob, dtype=np.float32)
+        return vectors
+    
+    def _encode(self, texts, batch_size=64):
+        """
+        Encode texts, computing only the ones missing from the embedding cache.
+        
+        Args:
+            texts (list): Texts to encode
+            batch_size (int): Encoder batch size for the cache misses
+            
+        Returns:
+            np.ndarray: float32 array of unit-length vectors, shape (len(texts), dim), in the order of texts
+        """
+        keys = [hashlib.sha256(f"{EMBEDDING_MODEL}\0{text}".encode()).hexdigest() for text in texts]
+        vectors = self._cached_vectors(keys)
+        misses = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        
+        # Encode all misses in one batched call and write them back
+        if misses:
+            encoded = self.embedder.encode(
+                list(misses.values()), batch_size=batch_size, convert_to_numpy=True,
+                normalize_embeddings=True, show_progress_bar=False
+            )
+            encoded = np.asarray(encoded, dtype=np.float32)
+            with self._emb_cache_lock, self._emb_cache:
+                self._emb_cache.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in zip(misses, encoded)]
+                )
+            vectors.update(zip(misses, encoded))
+        
+        return np.stack([vectors[key] for key in keys])
+    
+    def _embed_query(self, query_text):
+        """
+        Embed a single query text (wrapped with an in-memory LRU as embed_query).
+        
+        The text is casefolded and its whitespace collapsed before encoding, so queries that
+        differ only in case or spacing share one cache entry. Word order and punctuation are
+        kept; they can change the meaning.
+        
+        Args:
+            query_text (str): The text to embed
             
-    def load_data_from_csv(self, csv_path = "chat_history/historical_ticket_new.csv"):
+        Returns:
+            np.ndarray: Read-only, unit-length float32 embedding vector
+        """
+        vector = self._encode([" ".join(query_text.casefold().split())])[0]
+        vector.flags.writeable = False
+        return vector
+    
+    def _get_flat_index(self):
+        """
+        Build an inner-product index over every document in the collection, reusing it
+        until the document count changes (checked at most every FLAT_INDEX_RECHECK_SECONDS).
+        
+        The index is exact, except for collections of QUANTIZE_MIN_DOCUMENTS or more with
+        FAISS available, where int8 codes are scanned and the top candidates re-ranked exactly.
+        
+        Returns:
+            dict: Normalized vectors, ids, documents, metadatas and the FAISS index (or None)
+        """
+        with self._flat_lock:
+            # Other agents or clients may write to the collection, so check its size now and then
+            now = time.monotonic()
+            if self._flat_index is not None and now - self._flat_checked_at >= FLAT_INDEX_RECHECK_SECONDS:
+                self._flat_checked_at = now
+                if self.collection.count() != len(self._flat_index["ids"]):
+                    logger.debug("Collection changed, rebuilding flat index")
+                    self._flat_index = None
+            
+            if self._flat_index is None:
+                data = self.collection.get(include=["embeddings", "documents", "metadatas"])
+                vectors = np.asarray(data["embeddings"] or [], dtype=np.float32).reshape(len(data["ids"]), -1)
+                # New documents are stored unit length; this only matters for older collections
+                if len(vectors):
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                
+                index = None
+                if faiss is not None and len(vectors) >= QUANTIZE_MIN_DOCUMENTS:
+                    # Scan int8 codes, then re-rank k_factor * n candidates on the full vectors
+                    # so returned scores stay exact; train the quantizer on a sample
+                    quantized = faiss.IndexScalarQuantizer(
+                        vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+                    )
+                    index = faiss.IndexRefineFlat(quantized)
+                    index.k_factor = QUANTIZE_REFINE_FACTOR
+                    sample = np.random.default_rng(0).choice(
+                        len(vectors), min(len(vectors), QUANTIZE_TRAIN_SAMPLE), replace=False
+                    )
+                    index.train(vectors[sample])
+                    index.add(vectors)
+                elif faiss is not None and len(vectors):
+                    index = faiss.IndexFlatIP(vectors.shape[1])
+                    index.add(vectors)
+                
+                self._flat_index = {
+                    "vectors": vectors,
+                    "ids": data["ids"],
+                    "documents": data["documents"],
+                    "metadatas": data["metadatas"],
+                    "faiss": index
+                }
+                self._flat_checked_at = time.monotonic()
+                logger.debug("Built flat index over %d documents (faiss: %s)", len(vectors), index is not None)
+            return self._flat_index
+    
+    def _search_flat_index(self, flat, query_embedding, n_results):
+        """
+        Nearest-neighbour search against the flat index (approximate for large, quantized indexes).
+        
+        Args:
+            flat (dict): Flat index from _get_flat_index
+            query_embedding (np.ndarray): Unit-length query embedding
+            n_results (int): Number of results to return
+            
+        Returns:
+            tuple: (documents, metadatas, distances) for the top matches, best first
+        """
+        n_results = min(n_results, len(flat["vectors"]))
+        query = np.asarray(query_embedding, dtype=np.float32)
+        
+        if flat["faiss"] is not None:
+            scores, positions = flat["faiss"].search(query[None, :], n_results)
+            scores, positions = scores[0], positions[0]
+        else:
+            all_scores = flat["vectors"] @ query
+            positions = np.argpartition(-all_scores, n_results - 1)[:n_results]
+            positions = positions[np.argsort(-all_scores[positions])]
+            scores = all_scores[positions]
+        
+        # Convert inner products to the distance the collection's space reports: squared L2
+        # between unit vectors for l2, 1 - similarity for cosine and ip
+        scores = scores.astype(np.float64)
+        distances = 2.0 - 2.0 * scores if self.space == "l2" else 1.0 - scores
+        return (
+            [flat["documents"][i] for i in positions],
+            [flat["metadatas"][i] for i in positions],
+            distances
+        )
+    
+    def load_data_from_csv(self, csv_path = "chat_history/historical_ticket_new.csv", batch_size=10_000):
         """
         Load data from CSV and add to ChromaDB.
         
         Args:
             csv_path (str): Path to the CSV file
+            batch_size (int): Number of CSV rows read, embedded and added to the collection at a time
         """
         try:
             # Use absolute path for CSV if provided with relative path
@@ -55,65 +294,58 @@ class ChromaAgent:
             if not os.path.exists(csv_path):
                 print(f"CSV file not found at: {csv_path}")
                 return 0
+            
+            # Stream the CSV in chunks so peak memory stays flat regardless of the archive size
+            rows = 0
+            added = 0
+            for chunk in pd.read_csv(csv_path, chunksize=batch_size, dtype={'Ticket_ID': str}):
+                rows += len(chunk)
+                
+                # Skip ids that are already stored
+                existing = set(self.collection.get(ids=chunk['Ticket_ID'].tolist(), include=[])['ids'])
+                chunk = chunk[~chunk['Ticket_ID'].isin(existing)]
+                if chunk.empty:
+                    continue
                 
-            df = pd.read_csv(csv_path)
-            print(f"Loaded CSV with {len(df)} rows")
-            past_issues = []
-            
-            for index, row in df.iterrows():
-                past_issues.append({
-                    "id": str(row['Ticket_ID']),  # Ensure ID is a string
-                    "issue_summary": row['Issue_Category'],
-                    "solution": row['Solution'],
-                    "ticket_open_date": row['Ticket_Open_Date'],
-                    "resolution_date": row['Date_of_Resolution'],
-                    "assigned_team": row['Assigned_To_Team']
+                # Build documents, ids and metadata column-wise instead of row by row
+                texts = chunk['Issue_Category'].tolist()
+                ids = chunk['Ticket_ID'].tolist()
+                metadatas = chunk[['Solution', 'Ticket_Open_Date', 'Date_of_Resolution', 'Assigned_To_Team']].rename(columns={
+                    'Solution': 'solution',
+                    'Ticket_Open_Date': 'ticket_open_date',
+                    'Date_of_Resolution': 'resolution_date',
+                    'Assigned_To_Team': 'assigned_team'
                 })
                 
-            if not past_issues:
-                print("No issues found in CSV file")
-                return 0
+                # Precompute resolution time once here so queries don't parse dates; unparseable
+                # dates fall back to 24 hours
+                open_times = pd.to_datetime(chunk['Ticket_Open_Date'], errors='coerce', format='mixed')
+                resolve_times = pd.to_datetime(chunk['Date_of_Resolution'], errors='coerce', format='mixed')
+                metadatas['resolution_hours'] = ((resolve_times - open_times).dt.total_seconds() / 3600).fillna(24.0)
+                metadatas = metadatas.to_dict('records')
                 
-            # Embed and add to Chroma
-            texts = [item["issue_summary"] for item in past_issues]
-            print(f"Embedding {len(texts)} texts")
-            embeddings = self.embedder.encode(texts).tolist()
-            
-            metadatas = [{
-                "solution": item["solution"],
-                "ticket_open_date": item["ticket_open_date"],
-                "resolution_date": item["resolution_date"],
-                "assigned_team": item["assigned_team"]
-            } for item in past_issues]
+                print(f"Embedding {len(texts)} texts")
+                embeddings = self._encode(texts, batch_size=256).tolist()
+                
+                self.collection.add(
+                    documents=texts,
+                    embeddings=embeddings,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                added += len(ids)
             
-            ids = [item["id"] for item in past_issues]
+            print(f"Read {rows} rows from CSV")
+            if rows == 0:
+                print("No issues found in CSV file")
+                return 0
             
-            # Check if collection already has data
-            try:
-                before_count = self.collection.count()
-                print(f"Collection already has {before_count} documents before adding")
-            except Exception as e:
-                print(f"Error checking document count: {str(e)}")
-                before_count = 0
-            
-            # Add documents to collection
-            self.collection.add(
-                documents=texts,
-                embeddings=embeddings,
-                metadatas=metadatas,
-                ids=ids
-            )
-            
-            # Verify documents were added
-            try:
-                after_count = self.collection.count()
-                print(f"Collection now has {after_count} documents after adding")
-                added = after_count - before_count
-                print(f"Added {added} new documents")
-            except Exception as e:
-                print(f"Error checking document count after adding: {str(e)}")
-                added = len(past_issues)
+            # New documents invalidate the flat index; it is rebuilt on the next query
+            if added:
+                with self._flat_lock:
+                    self._flat_index = None
             
+            print(f"Added {added} new documents")
             return added
         
         except Exception as e:
@@ -131,54 +363,47 @@ class ChromaAgent:
         Returns:
             list: List of dictionaries containing similar issues with their metadata
         """
-        print(f"Querying ChromaDB for: '{query_text}'")
+        # Per-query logging is debug-level so the hot path does no stdout I/O by default
+        logger.debug("Querying ChromaDB for: '%s'", query_text)
         
         # Ensure we have something to query
         try:
-            count = self.collection.count()
-            print(f"Collection has {count} documents")
+            flat = self._get_flat_index()
+            count = len(flat["ids"])
+            logger.debug("Collection has %d documents", count)
             if count == 0:
-                print("WARNING: No documents in collection to query")
+                logger.warning("No documents in collection to query")
                 return []
         except Exception as e:
-            print(f"Error checking collection count: {str(e)}")
-            # If can't determine count, proceed with query anyway
+            logger.warning("Error building flat index: %s", e)
+            return []
         
         # Create embedding for the query
-        query_embedding = self.embedder.encode(query_text).tolist()
+        query_embedding = self.embed_query(query_text)
         
-        # Query the collection - ensure n_results is at least 1
+        # Search the flat index - ensure n_results is at least 1
         n_results = max(1, n_results)
         try:
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
-            )
+            documents, metadatas, distances = self._search_flat_index(flat, query_embedding, n_results)
             
-            # Check if results are valid
-            if not results or not results['documents'] or not results['documents'][0]:
-                print("Query returned no results")
-                return []
-                
-            print(f"Query returned {len(results['documents'][0])} results")
+            # Convert distances to similarity scores, rounded to 2 decimal places: ip/cosine distances
+            # are 1 - cosine similarity exactly, l2 distances use exponential decay
+            if self.space == "l2":
+                similarities = np.exp(-distances).round(2)
+            else:
+                similarities = (1.0 - distances).round(2)
             
             # Organize results
-            organized_results = []
-            for i in range(len(results['documents'][0])):
-                # Convert distance to similarity score using exponential decay
-                similarity = np.exp(-results['distances'][0][i])
-                
-                result = {
-                    'issue': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'similarity_score': round(similarity, 2)  # Round to 2 decimal places
-                }
-                organized_results.append(result)
-                
-                print(f"Result #{i+1}: '{result['issue']}' - Score: {result['similarity_score']}")
+            organized_results = [
+                {'issue': document, 'metadata': metadata, 'similarity_score': float(similarity)}
+                for document, metadata, similarity in zip(documents, metadatas, similarities)
+            ]
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, result in enumerate(organized_results):
+                    logger.debug("Result #%d: '%s' - Score: %s", i + 1, result['issue'], result['similarity_score'])
             
             return organized_results
         except Exception as e:
-            print(f"ERROR during query: {str(e)}")
+            logger.error("Error during query: %s", e)
             return [] 
\ No newline at end of file
@@ -1,13 +1,16 @@
 import openai
 import os
+import time
 
 class OpenAIClient:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, rate_limit_retries=4, rate_limit_backoff=1.0):
         """
         Initialize the OpenAI client.
         
         Args:
             api_key (str, optional): API key for OpenAI. If not provided, uses the one from the notebook.
+            rate_limit_retries (int): Extra attempts after a rate-limit error
+            rate_limit_backoff (float): Seconds to wait before the first retry; doubles each time
         """
         if api_key is None:
             # Default API key from notebook if not provided
@@ -17,6 +20,8 @@ class OpenAIClient:
             api_key=api_key,
             base_url="https://glhf.chat/api/openai/v1"
         )
+        self.rate_limit_retries = rate_limit_retries
+        self.rate_limit_backoff = rate_limit_backoff
         
     def get_response(self, user_prompt, system_prompt, chat_history=None):
         """
@@ -44,10 +49,18 @@ class OpenAIClient:
             # Add current user prompt
             messages.append({"role": "user", "content": user_prompt})
             
-            completion = self.client.chat.completions.create(
-                model="hf:meta-llama/Llama-4-Scout-17B-16E-Instruct",
-                messages=messages
-            )
+            # Retry rate-limited requests with exponential backoff (batch runs hit this first)
+            for attempt in range(self.rate_limit_retries + 1):
+                try:
+                    completion = self.client.chat.completions.create(
+                        model="hf:meta-llama/Llama-4-Scout-17B-16E-Instruct",
+                        messages=messages
+                    )
+                    break
+                except openai.RateLimitError:
+                    if attempt == self.rate_limit_retries:
+                        raise
+                    time.sleep(self.rate_limit_backoff * 2 ** attempt)
             
             response_text = completion.choices[0].message.content
             return response_text
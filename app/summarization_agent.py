@@ -1,7 +1,17 @@
 import json
+
+# orjson is optional; its JSONDecodeError subclasses json.JSONDecodeError, so handlers work either way
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
 from get_response import OpenAIClient
 from prompts import summarization_agent_prompt
 
+# Prompt templates are immutable, so every agent instance shares one copy
+SUMMARIZATION_PROMPT = summarization_agent_prompt()
+
 class SummarizationAgent:
     def __init__(self, openai_client=None):
         """
@@ -11,7 +21,7 @@ class SummarizationAgent:
             openai_client (OpenAIClient, optional): Client for OpenAI API
         """
         self.openai_client = openai_client if openai_client else OpenAIClient()
-        self.prompt_template = summarization_agent_prompt()
+        self.prompt_template = SUMMARIZATION_PROMPT
         
     def summarize_issue(self, query_text, chat_history=None):
         """
@@ -41,7 +51,7 @@ class SummarizationAgent:
                 if response.startswith("json") or response.startswith("JSON"):
                     response = response.replace("json", "", 1).replace("JSON", "", 1).strip()
                 
-                result = json.loads(response)
+                result = json_loads(response)
                 return {
                     "summary": result.get("summary", ""),
                     "sentiment": result.get("sentiment", ""),
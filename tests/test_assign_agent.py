@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from assign_agent import AssignAgent, GOOD_MATCH_SCORE, REFINE_BELOW_SCORE, l2_score_to_cosine
+
+
+class FakeChromaAgent:
+    """Chroma agent returning fixed matches and recording the queries it was asked"""
+    def __init__(self, space, scores):
+        self.space = space
+        self.db_dir = tempfile.mkdtemp()
+        self.scores = scores
+        self.queries = []
+
+    def embed_query(self, query_text):
+        return np.full(4, 0.5, dtype=np.float32)
+
+    def query(self, query_text, n_results=3):
+        self.queries.append(query_text)
+        return [
+            {
+                "issue": f"issue {i}",
+                "metadata": {"assigned_team": "Software", "solution": "Reinstall", "resolution_hours": 10.0},
+                "similarity_score": score
+            }
+            for i, score in enumerate(self.scores[:n_results])
+        ]
+
+
+class FakeOpenAIClient:
+    """LLM client answering every prompt with the same triage JSON"""
+    def get_response(self, user_prompt, system_prompt=None, chat_history=None):
+        return json.dumps({
+            "summary": "app crashes on launch",
+            "sentiment": "Frustrated",
+            "priority": "High",
+            "solution": "Reinstall the app",
+            "assigned_team": "Payments",
+            "reason": "test",
+            "estimated_resolution_hours": 5
+        })
+
+
+def make_agent(space, scores):
+    return AssignAgent(FakeOpenAIClient(), FakeChromaAgent(space, scores), summarization_agent=object())
+
+
+class ThresholdTest(unittest.TestCase):
+    def test_l2_thresholds_unchanged(self):
+        agent = make_agent("l2", [0.9])
+        self.assertEqual(agent.good_match_score, GOOD_MATCH_SCORE)
+        self.assertEqual(agent.refine_below_score, REFINE_BELOW_SCORE)
+
+    def test_ip_thresholds_converted_to_cosine(self):
+        for space in ("ip", "cosine"):
+            agent = make_agent(space, [0.9])
+            self.assertAlmostEqual(agent.good_match_score, 0.398, places=3)
+            self.assertAlmostEqual(agent.refine_below_score, 0.653, places=3)
+            # Same cutoff in both scales: exp(-(2 - 2 * cos)) recovers the l2 score
+            self.assertAlmostEqual(l2_score_to_cosine(GOOD_MATCH_SCORE), agent.good_match_score)
+
+    def test_weak_cosine_match_goes_to_llm(self):
+        # 0.35 passes the l2 cutoff but is a weak cosine similarity
+        result = make_agent("ip", [0.35]).process_and_assign("the app crashes", n_results=1)
+        self.assertEqual(result["source"], "LLM")
+        self.assertEqual(result["assigned_team"], "Payments")
+
+        result = make_agent("l2", [0.35]).process_and_assign("the app crashes", n_results=1)
+        self.assertEqual(result["source"], "historical_data")
+        self.assertEqual(result["assigned_team"], "Software")
+
+    def test_refine_with_summary_below_cosine_cutoff(self):
+        # 0.6 skips refinement on the l2 scale but not on the cosine one
+        agent = make_agent("ip", [0.6])
+        agent.process_and_assign("the app crashes", n_results=1)
+        self.assertEqual(agent.chroma_agent.queries, ["the app crashes", "app crashes on launch"])
+
+        agent = make_agent("l2", [0.6])
+        agent.process_and_assign("the app crashes", n_results=1)
+        self.assertEqual(agent.chroma_agent.queries, ["the app crashes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "admin"))
+
+from dynamic_ticketing import DynamicTicketing
+from ticket_actions import resolve_by_admin, add_admin_response
+
+
+class TicketActionsTest(unittest.TestCase):
+    def setUp(self):
+        db_path = os.path.join(tempfile.mkdtemp(), "tickets.sqlite3")
+        self.ticket_system = DynamicTicketing(db_path, legacy_json_path=None)
+        self.addCleanup(self.ticket_system.close)
+        self.ticket_id = self.ticket_system.create_new_ticket("App crashes", "Frustrated", "High", "Software")
+
+    def test_resolve_by_admin(self):
+        self.assertTrue(resolve_by_admin(self.ticket_system, self.ticket_id))
+        ticket = self.ticket_system.get_ticket(self.ticket_id)
+        self.assertEqual(ticket["Resolution_Status"], "Resolved")
+        self.assertEqual(ticket["Solution"], "Resolved by admin")
+        self.assertIsNotNone(ticket["Date_of_Resolution"])
+
+        # Already resolved
+        self.assertFalse(resolve_by_admin(self.ticket_system, self.ticket_id))
+
+    def test_add_admin_response(self):
+        self.assertTrue(add_admin_response(self.ticket_system, self.ticket_id, "Please reinstall"))
+        conversation = self.ticket_system.get_ticket(self.ticket_id)["conversation"]
+        self.assertEqual(len(conversation), 1)
+        self.assertEqual(conversation[0]["role"], "assistant")
+        self.assertEqual(conversation[0]["content"], "Please reinstall")
+
+        self.assertFalse(add_admin_response(self.ticket_system, "TECH_MISSING", "Hello"))
+
+
+if __name__ == "__main__":
+    unittest.main()